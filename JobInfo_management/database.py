@@ -0,0 +1,35 @@
+import dj_database_url
+
+
+POOL_MODE_PGBOUNCER = 'pgbouncer'
+POOL_MODES = ('', POOL_MODE_PGBOUNCER)
+
+
+def database_config(url, conn_max_age=0, conn_health_checks=True, pool_mode='', connect_timeout=None, pool_host=''):
+    """
+    DATABASE_URL から DATABASES['default'] を作る。
+
+    conn_max_age: 接続を使い回す秒数（0 ならリクエストごとに接続し直す）。
+    conn_health_checks: 使い回す接続が切れていないか、リクエストの最初に確認する。
+    pool_mode='pgbouncer': PgBouncer（transaction モード）経由で接続する。
+    同じサーバー側の接続が使われ続ける保証がないため、サーバー側カーソル（QuerySet.iterator()）を使わない。
+    pool_host: PgBouncer の host:port。URL のユーザー・パスワード・データベース名のまま、接続先だけを PgBouncer にする
+    """
+    if pool_mode not in POOL_MODES:
+        raise ValueError(f"DB_POOL_MODE には {', '.join(repr(mode) for mode in POOL_MODES)} のいずれかを指定してください。")
+    config = dj_database_url.parse(url, conn_max_age=conn_max_age, conn_health_checks=conn_health_checks)
+    if config['ENGINE'] == 'django.db.backends.postgresql':
+        options = config.setdefault('OPTIONS', {})
+        if connect_timeout:
+            options.setdefault('connect_timeout', connect_timeout)
+        # 使い回している間に途中の機器に切断されないよう、TCPのキープアライブを送る
+        options.setdefault('keepalives', 1)
+        options.setdefault('keepalives_idle', 30)
+    if pool_mode == POOL_MODE_PGBOUNCER:
+        config['DISABLE_SERVER_SIDE_CURSORS'] = True
+        if pool_host:
+            host, _, port = pool_host.partition(':')
+            config['HOST'] = host
+            if port:
+                config['PORT'] = int(port)
+    return config
@@ -1,7 +1,8 @@
 import os
 from pathlib import Path
 import environ
-import dj_database_url
+
+from .database import database_config
 
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -34,6 +35,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # METRICS_ENABLED=True のときだけ有効になる。すべての処理を計るため最初に置く
+    'jobinfo_application.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -65,11 +68,25 @@ TEMPLATES = [
 WSGI_APPLICATION = 'JobInfo_management.wsgi.application'
 
 
-# settings.py
+# データベースの接続（JobInfo_management/database.py を参照）。
+# DB_CONN_MAX_AGE: 接続を使い回す秒数。WSGI（gunicorn の sync/gthread ワーカー）や manage.py のワーカーでは
+# 接続とTLSのハンドシェイクを毎回行わずに済む。ASGI（UvicornWorker）ではリクエストごとにスレッドが変わり、
+# 使い回す接続がスレッドごとに残ってしまうため 0 のままにし、DB_POOL_MODE=pgbouncer で PgBouncer を経由させる。
+# DB_POOL_HOST: PgBouncer の host:port（Render では render.yaml の jobinfo-pgbouncer）。空なら DATABASE_URL に直接接続する
+DB_CONN_MAX_AGE = env.int('DB_CONN_MAX_AGE', default=0)
+DB_CONN_HEALTH_CHECKS = env.bool('DB_CONN_HEALTH_CHECKS', default=True)
+DB_POOL_MODE = env('DB_POOL_MODE', default='')
+DB_POOL_HOST = env('DB_POOL_HOST', default='')
+DB_CONNECT_TIMEOUT = env.int('DB_CONNECT_TIMEOUT', default=5)
 
 DATABASES = {
-    'default': dj_database_url.config(
-        default=env('DATABASE_URL')
+    'default': database_config(
+        env('DATABASE_URL'),
+        conn_max_age=DB_CONN_MAX_AGE,
+        conn_health_checks=DB_CONN_HEALTH_CHECKS,
+        pool_mode=DB_POOL_MODE,
+        connect_timeout=DB_CONNECT_TIMEOUT,
+        pool_host=DB_POOL_HOST,
     )
 }
 
@@ -110,6 +127,26 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# 書類のアップロード（分割アップロードの途中のファイルは公開しないディレクトリに置く）
+DOCUMENT_UPLOAD_MAX_SIZE = env.int('DOCUMENT_UPLOAD_MAX_SIZE', default=20 * 1024 * 1024)
+DOCUMENT_UPLOAD_CHUNK_SIZE = env.int('DOCUMENT_UPLOAD_CHUNK_SIZE', default=2 * 1024 * 1024)
+DOCUMENT_UPLOAD_SESSION_TTL = env.int('DOCUMENT_UPLOAD_SESSION_TTL', default=24 * 60 * 60)
+DOCUMENT_UPLOAD_TEMP_DIR = env('DOCUMENT_UPLOAD_TEMP_DIR', default=os.path.join(BASE_DIR, 'upload_tmp'))
+# 期限切れのセッションを削除する間隔（秒）。一時ファイルのある Web サービスで動く run_extraction_worker が削除する
+DOCUMENT_UPLOAD_PURGE_INTERVAL = env.int('DOCUMENT_UPLOAD_PURGE_INTERVAL', default=60 * 60)
+
+# 書類のダウンロード。'x-accel-redirect'（nginx）または 'x-sendfile'（Apache など）を指定すると、
+# ファイルの送信をWebサーバーに任せる。nginxでは DOCUMENT_SENDFILE_PREFIX を MEDIA_ROOT を指す internal な location にする
+DOCUMENT_SENDFILE_BACKEND = env('DOCUMENT_SENDFILE_BACKEND', default='')
+DOCUMENT_SENDFILE_PREFIX = env('DOCUMENT_SENDFILE_PREFIX', default='/protected-media/')
+DOCUMENT_CACHE_MAX_AGE = env.int('DOCUMENT_CACHE_MAX_AGE', default=60 * 60)
+
+# 書類の本文の抽出（manage.py run_extraction_worker で処理）。1ファイルあたりの制限時間（秒）と保存する最大文字数
+DOCUMENT_EXTRACTION_WORKERS = env.int('DOCUMENT_EXTRACTION_WORKERS', default=2)
+DOCUMENT_EXTRACTION_TIMEOUT = env.float('DOCUMENT_EXTRACTION_TIMEOUT', default=30.0)
+DOCUMENT_EXTRACTION_MAX_CHARS = env.int('DOCUMENT_EXTRACTION_MAX_CHARS', default=100_000)
+DOCUMENT_EXTRACTION_STALE_AFTER = env.int('DOCUMENT_EXTRACTION_STALE_AFTER', default=10 * 60)
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_URL = 'login'
@@ -123,6 +160,52 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
 
 OPENAI_API_KEY = env('OPENAI_API_KEY')
+OPENAI_BASE_URL = env('OPENAI_BASE_URL', default=None)
+OPENAI_MAX_RETRIES = env.int('OPENAI_MAX_RETRIES', default=2)
+
+# AIによるES回答生成ジョブ（manage.py run_es_worker で処理）
+ES_GENERATION_MAX_ATTEMPTS = env.int('ES_GENERATION_MAX_ATTEMPTS', default=3)
+ES_GENERATION_RETRY_DELAY = env.int('ES_GENERATION_RETRY_DELAY', default=10)
+ES_GENERATION_STALE_AFTER = env.int('ES_GENERATION_STALE_AFTER', default=5 * 60)
+ES_BATCH_MAX_WORKERS = env.int('ES_BATCH_MAX_WORKERS', default=4)
+
+# AIの応答キャッシュ（同じプロンプトならAPIを呼び出さない）
+AI_RESPONSE_CACHE_ENABLED = env.bool('AI_RESPONSE_CACHE_ENABLED', default=True)
+AI_RESPONSE_CACHE_TTL = env.int('AI_RESPONSE_CACHE_TTL', default=7 * 24 * 60 * 60)
+AI_RESPONSE_CACHE_MAX_ENTRIES = env.int('AI_RESPONSE_CACHE_MAX_ENTRIES', default=5000)
+# 期限切れ・上限超過の応答を削除する間隔（保存の回数）
+AI_RESPONSE_CACHE_EVICT_EVERY = env.int('AI_RESPONSE_CACHE_EVICT_EVERY', default=100)
+
+# キャッシュ。CACHE_URL で切り替える（locmemcache://、filecache:///var/tmp/jobinfo_cache、redis://127.0.0.1:6379/1 など。
+# redis は redis パッケージが必要）。内容の変更はデータベースのバージョン（fragments.py）で判断するため、
+# プロセスごとの locmemcache でも古い内容は表示されない。複数のワーカーやサービスでキャッシュを共有するには redis にする
+CACHES = {'default': env.cache('CACHE_URL', default='locmemcache://')}
+# 一覧・詳細ページの断片キャッシュの有効期限（秒）。内容が変わったときはバージョンを上げて破棄する（fragments.py）
+TEMPLATE_FRAGMENT_CACHE_TIMEOUT = env.int('TEMPLATE_FRAGMENT_CACHE_TIMEOUT', default=24 * 60 * 60)
+
+# 一覧ページの「今後の予定」
+UPCOMING_EVENTS_LIMIT = env.int('UPCOMING_EVENTS_LIMIT', default=10)
+UPCOMING_EVENTS_CACHE_TIMEOUT = env.int('UPCOMING_EVENTS_CACHE_TIMEOUT', default=60 * 60)
+
+# 企業名検索（Wikidata API）
+WIKIDATA_API_URL = env('WIKIDATA_API_URL', default='https://www.wikidata.org/w/api.php')
+COMPANY_SEARCH_TIMEOUT = env.float('COMPANY_SEARCH_TIMEOUT', default=2.0)
+COMPANY_SEARCH_CACHE_TTL = env.int('COMPANY_SEARCH_CACHE_TTL', default=60 * 60)
+COMPANY_SEARCH_CACHE_SIZE = env.int('COMPANY_SEARCH_CACHE_SIZE', default=1000)
+COMPANY_SEARCH_RATE_LIMIT = env.float('COMPANY_SEARCH_RATE_LIMIT', default=5.0)
+COMPANY_SEARCH_RATE_BURST = env.int('COMPANY_SEARCH_RATE_BURST', default=10)
+COMPANY_SEARCH_POOL_SIZE = env.int('COMPANY_SEARCH_POOL_SIZE', default=4)
+
+# 応募履歴のエクスポート（一度にデータベースから読み込む応募情報の件数）
+EXPORT_CHUNK_SIZE = env.int('EXPORT_CHUNK_SIZE', default=500)
+
+# CSVからの一括登録（一度に bulk_create する件数）
+CSV_IMPORT_BATCH_SIZE = env.int('CSV_IMPORT_BATCH_SIZE', default=500)
+
+# ビューごとの処理時間・クエリ数の計測（/metrics/ でPrometheus形式で公開、管理者のみ）。
+# METRICS_SLOW_REQUEST_SECONDS 以上かかったリクエストは警告ログに出す
+METRICS_ENABLED = env.bool('METRICS_ENABLED', default=False)
+METRICS_SLOW_REQUEST_SECONDS = env.float('METRICS_SLOW_REQUEST_SECONDS', default=1.0)
 
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
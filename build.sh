@@ -5,4 +5,5 @@ set -o errexit
 pip install -r requirements.txt
 
 python manage.py collectstatic --no-input
-python manage.py migrate
\ No newline at end of file
+# ビルド中は Render のプライベートネットワーク（PgBouncer）に接続できないため、データベースに直接接続する
+DB_POOL_HOST= python manage.py migrate
\ No newline at end of file
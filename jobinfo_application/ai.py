@@ -0,0 +1,189 @@
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from openai import AsyncOpenAI, OpenAI
+
+from . import ai_cache
+
+
+SYSTEM_MESSAGE = "あなたは優秀なキャリアアドバイザーです。"
+
+COMPLETION_PARAMS = {
+    'model': "gpt-3.5-turbo",
+    'max_tokens': 600,
+    'temperature': 0.7,
+}
+
+
+class EmptyDraftError(Exception):
+    """AIが空の回答を返した"""
+
+
+def get_client():
+    """OpenAIクライアントを作成"""
+    return OpenAI(
+        api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL, max_retries=settings.OPENAI_MAX_RETRIES
+    )
+
+
+def get_async_client():
+    """非同期版のOpenAIクライアントを作成"""
+    return AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL, max_retries=settings.OPENAI_MAX_RETRIES
+    )
+
+
+def build_context(job_application, user_profile):
+    """プロンプトに埋め込む、候補者と企業の情報"""
+    user_info = f"スキル: {user_profile.skills}\n経験: {user_profile.experience}\n自己PR: {user_profile.self_pr}"
+    company_info = f"企業名: {job_application.company_name}\n経営理念: {job_application.corporate_philosophy}\n求める人物像: {job_application.ideal_candidate}\n業務内容: {job_application.job_description}"
+    return user_info, company_info
+
+
+def build_messages(question, context):
+    """ES設問と情報から、チャットAPIに渡すメッセージを組み立てる"""
+    user_info, company_info = context
+    prompt = f"""あなたは優秀なキャリアアドバイザーです。以下のES設問に対し、候補者のプロフィールと企業の情報を最大限に活用し、説得力のある回答ドラフトを400字程度で作成してください。
+
+    # ES設問
+    {question}
+
+    # 候補者のプロフィール情報
+    {user_info}
+
+    # 企業の情報
+    {company_info}
+
+    # 作成する回答ドラフト
+    """
+    return [
+        {"role": "system", "content": SYSTEM_MESSAGE},
+        {"role": "user", "content": prompt}
+    ]
+
+
+DraftResponse = namedtuple('DraftResponse', ['text', 'latency_ms', 'prompt_tokens', 'completion_tokens'])
+
+
+def _usage_tokens(response, name):
+    """応答に含まれるトークン数。usageがない応答では0"""
+    value = getattr(getattr(response, 'usage', None), name, 0)
+    return value if isinstance(value, int) else 0
+
+
+def request_draft(client, messages):
+    """APIを呼び出して回答ドラフトを取得する（データベースには触れない）。空の回答なら EmptyDraftError"""
+    started = time.monotonic()
+    response = client.chat.completions.create(
+        messages=messages,
+        **COMPLETION_PARAMS
+    )
+    ai_draft = (response.choices[0].message.content or '').strip()
+    if not ai_draft:
+        raise EmptyDraftError('AIが空の回答を返しました。')
+    return DraftResponse(
+        ai_draft,
+        int((time.monotonic() - started) * 1000),
+        _usage_tokens(response, 'prompt_tokens'),
+        _usage_tokens(response, 'completion_tokens'),
+    )
+
+
+def request_drafts(client, messages_list, max_workers):
+    """
+    複数の設問のAPI呼び出しを、最大 max_workers 件ずつ並行して行う。
+    戻り値は入力と同じ順序の DraftResponse、または失敗時はその例外
+    """
+    def call(messages):
+        try:
+            return request_draft(client, messages)
+        except Exception as e:
+            return e
+
+    if max_workers <= 1 or len(messages_list) <= 1:
+        return [call(messages) for messages in messages_list]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(call, messages_list))
+
+
+def _cache_response(cache_key, draft):
+    ai_cache.put(
+        cache_key, COMPLETION_PARAMS['model'], draft.text,
+        latency_ms=draft.latency_ms,
+        prompt_tokens=draft.prompt_tokens,
+        completion_tokens=draft.completion_tokens,
+    )
+
+
+def generate_drafts(entry_sheets, context, client=None, regenerate=False, max_workers=None):
+    """
+    同じ応募情報の複数のES設問について、回答ドラフトをまとめて生成する。
+    候補者・企業の情報 (context) は全設問で共有し、APIの呼び出しだけを並行して行う。
+    キャッシュの読み書きは呼び出し元のスレッドで行う。
+    戻り値は設問ごとの {entry_sheet, ai_draft, error, cached} のリスト
+    """
+    results = []
+    pending = []
+    for entry_sheet in entry_sheets:
+        messages = build_messages(entry_sheet.question, context)
+        cache_key = ai_cache.make_key(messages, COMPLETION_PARAMS)
+        result = {'entry_sheet': entry_sheet, 'ai_draft': None, 'error': None, 'cached': False}
+        cached = None if regenerate else ai_cache.get(cache_key)
+        if cached is not None:
+            result.update(ai_draft=cached, cached=True)
+        else:
+            pending.append((result, cache_key, messages))
+        results.append(result)
+
+    if pending:
+        max_workers = max_workers or settings.ES_BATCH_MAX_WORKERS
+        responses = request_drafts(client or get_client(), [messages for _, _, messages in pending], max_workers)
+        for (result, cache_key, _), draft in zip(pending, responses):
+            if isinstance(draft, Exception):
+                result['error'] = draft
+                continue
+            _cache_response(cache_key, draft)
+            result['ai_draft'] = draft.text
+    return results
+
+
+async def stream_draft(question, context, client=None, regenerate=False):
+    """
+    回答ドラフトを生成し、届いたトークンから順に返す非同期ジェネレーター。
+    キャッシュにあれば、APIを呼び出さずにキャッシュの内容をまとめて返す
+    """
+    messages = build_messages(question, context)
+    cache_key = ai_cache.make_key(messages, COMPLETION_PARAMS)
+    if not regenerate:
+        cached = await sync_to_async(ai_cache.get)(cache_key)
+        if cached is not None:
+            yield cached
+            return
+
+    owns_client = client is None
+    client = client or get_async_client()
+    chunks = []
+    started = time.monotonic()
+    try:
+        stream = await client.chat.completions.create(
+            messages=messages,
+            stream=True,
+            **COMPLETION_PARAMS
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                chunks.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+    finally:
+        if owns_client:
+            await client.close()
+
+    ai_draft = ''.join(chunks).strip()
+    if ai_draft:
+        await sync_to_async(ai_cache.put)(
+            cache_key, COMPLETION_PARAMS['model'], ai_draft,
+            latency_ms=int((time.monotonic() - started) * 1000),
+        )
@@ -0,0 +1,107 @@
+import datetime
+import hashlib
+import json
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .models import AIResponseCacheEntry
+
+
+def make_key(messages, params):
+    """送信するメッセージとモデル・パラメータが完全に一致する場合だけ同じになるキー"""
+    payload = json.dumps({'messages': messages, **params}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _fresh_entries():
+    threshold = timezone.now() - datetime.timedelta(seconds=settings.AI_RESPONSE_CACHE_TTL)
+    return AIResponseCacheEntry.objects.filter(created_at__gte=threshold)
+
+
+def get(key):
+    """キャッシュされた応答を返し、ヒット数を記録する。なければ None"""
+    if not settings.AI_RESPONSE_CACHE_ENABLED:
+        return None
+    entry = _fresh_entries().filter(key=key).only('id', 'response').first()
+    if entry is None:
+        return None
+    AIResponseCacheEntry.objects.filter(pk=entry.pk).update(hits=F('hits') + 1, last_used_at=timezone.now())
+    return entry.response
+
+
+def put(key, model, response, latency_ms, prompt_tokens=0, completion_tokens=0):
+    """
+    APIの応答を保存する。AI_RESPONSE_CACHE_EVICT_EVERY 回の保存ごとに、期限切れと上限件数を超えた分を削除する
+    （manage.py purge_ai_cache でも削除できる）
+    """
+    if not settings.AI_RESPONSE_CACHE_ENABLED:
+        return
+    now = timezone.now()
+    values = {
+        'model': model,
+        'response': response,
+        'latency_ms': latency_ms,
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'created_at': now,
+        'last_used_at': now,
+    }
+    # 再生成した場合は内容を上書きし、API呼び出し回数を加算する
+    entries = AIResponseCacheEntry.objects.filter(key=key)
+    if not entries.update(misses=F('misses') + 1, **values):
+        try:
+            with transaction.atomic():
+                AIResponseCacheEntry.objects.create(key=key, **values)
+        except IntegrityError:
+            # 同じプロンプトの応答が同時に保存された場合は、保存済みの行を上書きする
+            entries.update(misses=F('misses') + 1, **values)
+    if _count_write():
+        evict()
+
+
+# 前回の削除からの保存回数（プロセスごと）
+_writes = 0
+_writes_lock = threading.Lock()
+
+
+def _count_write():
+    """保存のたびに表全体を調べないよう、一定回数ごとにだけ削除する"""
+    global _writes
+    with _writes_lock:
+        _writes += 1
+        if _writes < settings.AI_RESPONSE_CACHE_EVICT_EVERY:
+            return False
+        _writes = 0
+        return True
+
+
+def evict():
+    """期限切れの応答と、上限件数を超えた最近使われていない応答を削除し、削除した件数を返す"""
+    threshold = timezone.now() - datetime.timedelta(seconds=settings.AI_RESPONSE_CACHE_TTL)
+    deleted, _ = AIResponseCacheEntry.objects.filter(created_at__lt=threshold).delete()
+    overflow_ids = list(
+        AIResponseCacheEntry.objects.order_by('-last_used_at', '-id')
+        .values_list('id', flat=True)[settings.AI_RESPONSE_CACHE_MAX_ENTRIES:]
+    )
+    if overflow_ids:
+        deleted += AIResponseCacheEntry.objects.filter(id__in=overflow_ids).delete()[0]
+    return deleted
+
+
+def stats():
+    """ヒット・ミスの件数と、キャッシュによって節約できた時間・トークン数"""
+    totals = AIResponseCacheEntry.objects.aggregate(
+        total_entries=Count('id'),
+        total_hits=Sum('hits'),
+        total_misses=Sum('misses'),
+        total_saved_latency_ms=Sum(F('hits') * F('latency_ms')),
+        total_saved_tokens=Sum(F('hits') * (F('prompt_tokens') + F('completion_tokens'))),
+    )
+    totals = {name[len('total_'):]: value or 0 for name, value in totals.items()}
+    requests = totals['hits'] + totals['misses']
+    totals['hit_rate'] = round(totals['hits'] / requests, 4) if requests else 0.0
+    return totals
@@ -0,0 +1,595 @@
+"""
+主要なビューの負荷テスト（manage.py seed_benchmark_data と manage.py run_benchmark）。
+
+ベンチマーク用のユーザーと応募情報・面接ログ・ES設問・職種カテゴリを乱数の種から再現可能に作り、
+決まった手順のリクエストを Django のテストクライアント（プロセス内）またはローカルの gunicorn に送って、
+ビューごとのレイテンシ（p50/p95/p99）、1リクエストあたりのクエリ数、最大RSSを測る。
+結果はコミット済みのベースライン（benchmark_baseline.json）と比べ、悪化したものを報告する。
+"""
+import datetime
+import json
+import os
+import random
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict, namedtuple
+from contextlib import contextmanager
+
+import requests
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import close_old_connections, connection, transaction
+from django.db.backends.signals import connection_created
+from django.middleware.csrf import CSRF_ALLOWED_CHARS
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from . import stats
+from .models import EntrySheet, InterviewLog, JobApplication, JobType
+from .search import document_value
+
+
+USERNAME_PREFIX = 'bench_user_'
+PASSWORD = 'benchmark-password'
+# ベンチマーク中に作成した応募情報の企業名（終了時に削除する）
+CREATED_COMPANY_PREFIX = 'ベンチマーク作成'
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'benchmark_baseline.json')
+BATCH_SIZE = 500
+
+TARGET_CLIENT = 'client'
+TARGET_GUNICORN = 'gunicorn'
+
+
+# 合成データの材料
+
+COMPANY_WORDS = (
+    ('テック', 'データ', 'クラウド', 'みらい', 'グローバル', '日本', 'ネクスト', 'スマート', 'メディカル', 'フィナンシャル'),
+    ('ソリューションズ', 'システムズ', 'ラボ', '工業', '商事', 'ホールディングス', 'ネットワークス', 'デザイン'),
+)
+JOB_TITLES = (
+    'バックエンドエンジニア', 'フロントエンドエンジニア', 'データサイエンティスト', 'SRE',
+    'プロダクトマネージャー', '法人営業', '企画職', 'ITコンサルタント',
+)
+JOB_TYPE_BASES = (
+    'バックエンド', 'フロントエンド', 'インフラ', '機械学習', 'データ分析', 'モバイル',
+    'QA', 'セキュリティ', '組込み', 'PM', '営業', 'マーケティング',
+)
+JOB_TYPE_SUFFIXES = ('', '（新卒）', '（インターン）', 'リード', 'アシスタント')
+SENTENCES = (
+    '社会の課題をテクノロジーで解決することを目指しています。',
+    'チームで協力しながら主体的に行動できる方を求めています。',
+    'PythonとDjangoを用いたWebサービスの開発を担当します。',
+    '顧客の要望をヒアリングし、最適な提案を行います。',
+    '大規模なデータを分析し、事業の意思決定を支援します。',
+    '新しい技術を積極的に学び、挑戦し続ける姿勢を大切にしています。',
+    'グローバルに事業を展開しており、海外拠点との連携も多くあります。',
+    '若手のうちから裁量の大きな仕事を任せる文化があります。',
+)
+INTERVIEW_STAGES = ('カジュアル面談', '一次面接', '二次面接', 'グループディスカッション', '最終面接')
+ES_QUESTIONS = (
+    '学生時代に最も力を入れたことを教えてください。',
+    '当社を志望する理由を教えてください。',
+    'あなたの強みと、それを発揮したエピソードを教えてください。',
+    'チームで困難を乗り越えた経験を教えてください。',
+    '入社後に挑戦したいことを教えてください。',
+    '10年後のキャリアについて教えてください。',
+)
+
+
+def _paragraph(rng, low=2, high=6):
+    return ''.join(rng.choice(SENTENCES) for _ in range(rng.randint(low, high)))
+
+
+def _company_name(rng, i):
+    return f'{rng.choice(COMPANY_WORDS[0])}{rng.choice(COMPANY_WORDS[1])}{i}'
+
+
+def job_type_names(count):
+    names = [f'{base}{suffix}' for suffix in JOB_TYPE_SUFFIXES for base in JOB_TYPE_BASES]
+    return names[:count]
+
+
+def benchmark_users():
+    return User.objects.filter(username__startswith=USERNAME_PREFIX).order_by('id')
+
+
+def seed(users=3, applications=2000, logs=2, questions=2, job_types=60, random_seed=42, stdout=None):
+    """
+    ベンチマーク用の合成データを作る（同じ random_seed なら同じ内容になる）。
+    既存のベンチマーク用ユーザーは、関連するデータごと削除してから作り直す。
+    1人目のユーザーは /metrics/ を読めるように管理者にする。作成した件数を返す
+    """
+    rng = random.Random(random_seed)
+    today = timezone.localdate()
+    counts = {'users': 0, 'applications': 0, 'interview_logs': 0, 'entry_sheets': 0}
+    benchmark_users().delete()
+    job_type_ids = list(JobType.objects.resolve_names(job_type_names(job_types)).values())
+    job_type_ids.sort()
+
+    for u in range(users):
+        user = User.objects.create_user(f'{USERNAME_PREFIX}{u}', password=PASSWORD, is_staff=(u == 0))
+        counts['users'] += 1
+        for start in range(0, applications, BATCH_SIZE):
+            with transaction.atomic():
+                batch = []
+                for i in range(start, min(start + BATCH_SIZE, applications)):
+                    application = JobApplication(
+                        user=user,
+                        company_name=_company_name(rng, i),
+                        job_title=rng.choice(JOB_TITLES),
+                        status=rng.choice(JobApplication.STATUS_CHOICES)[0],
+                        next_action=rng.choice(INTERVIEW_STAGES) if rng.random() < 0.6 else None,
+                        next_action_date=today + datetime.timedelta(days=rng.randint(-60, 60)),
+                        corporate_philosophy=_paragraph(rng),
+                        ideal_candidate=_paragraph(rng),
+                        job_description=_paragraph(rng, 4, 10),
+                        notes=_paragraph(rng, 0, 3),
+                    )
+                    # bulk_create ではシグナルが送られないため、検索用の列もここで設定する
+                    application.search_vector = document_value(application)
+                    batch.append(application)
+                created = JobApplication.objects.bulk_create(batch)
+
+                through = JobApplication.job_types.through
+                through.objects.bulk_create([
+                    through(jobapplication_id=application.pk, jobtype_id=job_type_id)
+                    for application in created
+                    for job_type_id in rng.sample(job_type_ids, k=min(len(job_type_ids), rng.randint(0, 3)))
+                ])
+
+                interview_logs = []
+                entry_sheets = []
+                for application in created:
+                    for _ in range(rng.randint(0, logs * 2)):
+                        log = InterviewLog(
+                            job_application=application,
+                            stage=rng.choice(INTERVIEW_STAGES),
+                            interview_date=today + datetime.timedelta(days=rng.randint(-90, 30)),
+                            questions_asked=_paragraph(rng),
+                            self_evaluation=_paragraph(rng, 1, 3),
+                        )
+                        log.search_vector = document_value(log)
+                        interview_logs.append(log)
+                    for question in rng.sample(ES_QUESTIONS, k=min(len(ES_QUESTIONS), questions)):
+                        entry_sheet = EntrySheet(
+                            job_application=application,
+                            question=question,
+                            answer=_paragraph(rng, 3, 8) if rng.random() < 0.5 else '',
+                        )
+                        entry_sheet.search_vector = document_value(entry_sheet)
+                        entry_sheets.append(entry_sheet)
+                InterviewLog.objects.bulk_create(interview_logs)
+                EntrySheet.objects.bulk_create(entry_sheets)
+            counts['applications'] += len(created)
+            counts['interview_logs'] += len(interview_logs)
+            counts['entry_sheets'] += len(entry_sheets)
+            if stdout is not None:
+                stdout.write(f'{user.username}: {min(start + BATCH_SIZE, applications)}/{applications}')
+        stats.rebuild(user.pk)
+    return counts
+
+
+# シナリオ
+
+Scenario = namedtuple('Scenario', ['name', 'method', 'build'])
+
+
+def _application_data(rng, company_name):
+    return {
+        'company_name': company_name,
+        'job_title': rng.choice(JOB_TITLES),
+        'status': rng.choice(JobApplication.STATUS_CHOICES)[0],
+        'job_types_input': ', '.join(rng.sample(job_type_names(10), k=2)),
+        'job_description': _paragraph(rng),
+        'next_action': rng.choice(INTERVIEW_STAGES),
+        'next_action_date': (timezone.localdate() + datetime.timedelta(days=rng.randint(1, 30))).isoformat(),
+        'notes': _paragraph(rng, 0, 2),
+    }
+
+
+SCENARIOS = [
+    Scenario('application-list', 'GET', lambda rng, data: (reverse('application-list'), None)),
+    Scenario(
+        'application-detail', 'GET',
+        lambda rng, data: (reverse('application-detail', kwargs={'pk': rng.choice(data.application_ids)}), None),
+    ),
+    Scenario(
+        'search-jobtype', 'GET',
+        lambda rng, data: (reverse('search-jobtype'), {'term': rng.choice(data.job_type_names)[:2]}),
+    ),
+    Scenario(
+        'application-create', 'POST',
+        lambda rng, data: (reverse('application-create'), _application_data(rng, f'{CREATED_COMPANY_PREFIX}{rng.random()}')),
+    ),
+    Scenario(
+        'application-update', 'POST',
+        lambda rng, data: (
+            reverse('application-update', kwargs={'pk': rng.choice(data.application_ids)}),
+            _application_data(rng, _company_name(rng, rng.randint(0, 999))),
+        ),
+    ),
+    Scenario(
+        'es-detail', 'GET',
+        lambda rng, data: (reverse('es-detail', kwargs={'pk': rng.choice(data.entry_sheet_ids)}), None),
+    ),
+]
+SCENARIO_NAMES = [scenario.name for scenario in SCENARIOS]
+
+BenchmarkData = namedtuple('BenchmarkData', ['user', 'application_ids', 'entry_sheet_ids', 'job_type_names'])
+
+
+def load_data():
+    """シナリオで使うユーザーとID（seed_benchmark_data で作成したもの）"""
+    user = benchmark_users().first()
+    if user is None:
+        raise LookupError('ベンチマーク用のデータがありません。先に manage.py seed_benchmark_data を実行してください。')
+    application_ids = list(JobApplication.objects.filter(user=user).order_by('id').values_list('id', flat=True))
+    entry_sheet_ids = list(
+        EntrySheet.objects.filter(job_application__user=user).order_by('id').values_list('id', flat=True)
+    )
+    names = list(JobType.objects.order_by('name').values_list('name', flat=True))
+    return BenchmarkData(user, application_ids, entry_sheet_ids, names)
+
+
+def _rss_mb(kilobytes):
+    return round(kilobytes / 1024, 1)
+
+
+def _process_peak_rss_kb(pid):
+    """/proc から、プロセスの最大RSS（VmHWM）をKBで読む"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def _child_pids(pid):
+    children = []
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat') as f:
+                # 2番目の項目（コマンド名）は空白を含むことがあるため、最後の ')' の後から数える
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(name))
+    return children
+
+
+class ClientTarget:
+    """Djangoのテストクライアントで、このプロセスの中でリクエストを処理する"""
+
+    name = TARGET_CLIENT
+
+    def __init__(self, user):
+        self.client = Client()
+        self.client.force_login(user)
+        self._queries = 0
+
+    def _count(self, execute, sql, params, many, context):
+        self._queries += 1
+        return execute(sql, params, many, context)
+
+    def request(self, scenario, path, data):
+        """(ステータス, 秒, クエリ数) を返す"""
+        self._queries = 0
+        send = self.client.post if scenario.method == 'POST' else self.client.get
+        with connection.execute_wrapper(self._count):
+            started = time.perf_counter()
+            response = send(path, data)
+            elapsed = time.perf_counter() - started
+        return response.status_code, elapsed, self._queries
+
+    def start_scenario(self, scenario):
+        pass
+
+    def queries_per_request(self, scenario, measured):
+        return statistics.fmean(measured) if measured else 0.0
+
+    def peak_rss_mb(self):
+        return _rss_mb(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+class HTTPTarget:
+    """
+    起動中のサーバーにHTTPでリクエストを送る。
+    クエリ数はサーバーの /metrics/（METRICS_ENABLED=True）から、シナリオの前後の差で求める
+    """
+
+    name = TARGET_GUNICORN
+
+    def __init__(self, base_url, user, server_pid=None):
+        self.base_url = base_url.rstrip('/')
+        self.server_pid = server_pid
+        self.session = requests.Session()
+        # ログイン画面を通さず、テストクライアントと同じ方法でセッションを作る
+        client = Client()
+        client.force_login(user)
+        self.session.cookies.set(settings.SESSION_COOKIE_NAME, client.cookies[settings.SESSION_COOKIE_NAME].value)
+        csrf_token = get_random_string(32, CSRF_ALLOWED_CHARS)
+        self.session.cookies.set(settings.CSRF_COOKIE_NAME, csrf_token)
+        self.session.headers['X-CSRFToken'] = csrf_token
+        self._metrics_before = None
+
+    def request(self, scenario, path, data):
+        started = time.perf_counter()
+        if scenario.method == 'POST':
+            response = self.session.post(self.base_url + path, data=data, allow_redirects=False)
+        else:
+            response = self.session.get(self.base_url + path, params=data, allow_redirects=False)
+        elapsed = time.perf_counter() - started
+        return response.status_code, elapsed, None
+
+    def _query_totals(self, scenario):
+        """/metrics/ のクエリ数の合計とリクエスト数。読めなければ None"""
+        response = self.session.get(self.base_url + reverse('metrics'), allow_redirects=False)
+        if response.status_code != 200:
+            return None
+        labels = f'{{view="{scenario.name}"}}'
+        totals = {'sum': 0.0, 'count': 0.0}
+        for line in response.text.splitlines():
+            for key in totals:
+                if line.startswith(f'jobinfo_db_queries_{key}{labels} '):
+                    totals[key] = float(line.rsplit(' ', 1)[1])
+        return totals
+
+    def start_scenario(self, scenario):
+        self._metrics_before = self._query_totals(scenario)
+
+    def queries_per_request(self, scenario, measured):
+        after = self._query_totals(scenario)
+        if after is None or self._metrics_before is None:
+            return None
+        count = after['count'] - self._metrics_before['count']
+        return (after['sum'] - self._metrics_before['sum']) / count if count else 0.0
+
+    def peak_rss_mb(self):
+        if self.server_pid is None:
+            return None
+        pids = [self.server_pid] + _child_pids(self.server_pid)
+        return _rss_mb(max(_process_peak_rss_kb(pid) for pid in pids))
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def gunicorn_server(workers=1, timeout=30):
+    """
+    本番と同じ構成（ASGI + UvicornWorker）の gunicorn をローカルで起動し、(URL, PID) を返す。
+    クエリ数を測るため METRICS_ENABLED=True で起動する
+    """
+    port = _free_port()
+    env = dict(os.environ, METRICS_ENABLED='True', METRICS_SLOW_REQUEST_SECONDS='60')
+    process = subprocess.Popen(
+        [
+            sys.executable, '-m', 'gunicorn', 'JobInfo_management.asgi:application',
+            '-k', 'uvicorn_worker.UvicornWorker', '--workers', str(workers), '--bind', f'127.0.0.1:{port}',
+        ],
+        cwd=settings.BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f'gunicorn が起動しませんでした: {process.stderr.read().decode()[-2000:]}')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError('gunicorn の起動を待つ間にタイムアウトしました。')
+                time.sleep(0.2)
+        yield f'http://127.0.0.1:{port}', process.pid
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        process.stderr.close()
+
+
+def _percentiles(values):
+    if len(values) == 1:
+        return values * 3
+    cuts = statistics.quantiles(values, n=100, method='inclusive')
+    return cuts[49], cuts[94], cuts[98]
+
+
+# application-update で書き換わる列
+RESTORED_FIELDS = (
+    'company_name', 'job_title', 'status', 'corporate_philosophy', 'ideal_candidate',
+    'job_description', 'next_action', 'next_action_date', 'notes',
+)
+
+
+def _snapshot(user):
+    rows = {
+        row.pop('id'): row
+        for row in JobApplication.objects.filter(user=user).values('id', *RESTORED_FIELDS)
+    }
+    job_types = defaultdict(set)
+    through = JobApplication.job_types.through
+    for application_id, job_type_id in (
+        through.objects.filter(jobapplication__user=user).values_list('jobapplication_id', 'jobtype_id')
+    ):
+        job_types[application_id].add(job_type_id)
+    return rows, job_types
+
+
+def _restore(user, snapshot):
+    """
+    実行前の状態に戻す（次の実行でも同じクエリが発行されるように）。
+    集計や検索用の列も戻すため、変更された行はシグナルが送られる save() で書き戻す
+    """
+    JobApplication.objects.filter(user=user, company_name__startswith=CREATED_COMPANY_PREFIX).delete()
+    rows, job_types = snapshot
+    current_rows, current_job_types = _snapshot(user)
+    for pk, row in rows.items():
+        if current_rows.get(pk) == row and current_job_types.get(pk, set()) == job_types.get(pk, set()):
+            continue
+        application = JobApplication.objects.get(pk=pk)
+        for name, value in row.items():
+            setattr(application, name, value)
+        application.save()
+        application.job_types.set(job_types.get(pk, ()))
+
+
+def run(target, data, scenarios=None, iterations=50, warmup=5, random_seed=42):
+    """
+    シナリオを順に iterations 回ずつ実行し、{シナリオ名: 結果} を返す。
+    各シナリオの最初の warmup 回は測定に含めない。作成・更新した応募情報は最後に元に戻す
+    """
+    results = {}
+    snapshot = _snapshot(data.user)
+    try:
+        for scenario in SCENARIOS:
+            if scenarios and scenario.name not in scenarios:
+                continue
+            rng = random.Random(f'{random_seed}:{scenario.name}')
+            for _ in range(warmup):
+                target.request(scenario, *scenario.build(rng, data))
+            target.start_scenario(scenario)
+            latencies = []
+            queries = []
+            errors = 0
+            for _ in range(iterations):
+                status, elapsed, query_count = target.request(scenario, *scenario.build(rng, data))
+                latencies.append(elapsed * 1000)
+                if query_count is not None:
+                    queries.append(query_count)
+                if status >= 400:
+                    errors += 1
+            p50, p95, p99 = _percentiles(latencies)
+            query_mean = target.queries_per_request(scenario, queries)
+            results[scenario.name] = {
+                'p50_ms': round(p50, 2),
+                'p95_ms': round(p95, 2),
+                'p99_ms': round(p99, 2),
+                'queries': round(query_mean, 2) if query_mean is not None else None,
+                'peak_rss_mb': target.peak_rss_mb(),
+                'errors': errors,
+            }
+    finally:
+        _restore(data.user, snapshot)
+    return results
+
+
+def run_client(data, **kwargs):
+    # テストクライアントのホスト名 testserver を許可する
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+        return run(ClientTarget(data.user), data, **kwargs)
+
+
+def run_gunicorn(data, workers=1, **kwargs):
+    with gunicorn_server(workers=workers) as (url, pid):
+        return run(HTTPTarget(url, data.user, server_pid=pid), data, **kwargs)
+
+
+# ベースラインとの比較
+
+def load_baseline(path=BASELINE_PATH):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baseline(target_name, results, path=BASELINE_PATH, meta=None):
+    """target_name の結果だけを書き換えて保存する"""
+    baseline = load_baseline(path)
+    baseline[target_name] = {'meta': meta or {}, 'scenarios': results}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare(results, baseline, latency_tolerance=0.5, rss_tolerance=0.25):
+    """
+    ベースラインより悪化した項目を文字列のリストで返す。
+    レイテンシ（p95）と最大RSSは許容幅を超えた場合、クエリ数は1件でも増えた場合、
+    エラーのレスポンスは1件でもあった場合に報告する
+    """
+    regressions = []
+    for name, result in results.items():
+        if result['errors']:
+            regressions.append(f"{name}: {result['errors']} 件のリクエストがエラーになりました")
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if result['p95_ms'] > base['p95_ms'] * (1 + latency_tolerance):
+            regressions.append(f"{name}: p95 {result['p95_ms']}ms（ベースライン {base['p95_ms']}ms）")
+        if None not in (result['queries'], base['queries']) and result['queries'] > base['queries'] + 0.01:
+            regressions.append(f"{name}: クエリ数 {result['queries']}（ベースライン {base['queries']}）")
+        if (
+            None not in (result['peak_rss_mb'], base['peak_rss_mb'])
+            and result['peak_rss_mb'] > base['peak_rss_mb'] * (1 + rss_tolerance)
+        ):
+            regressions.append(f"{name}: 最大RSS {result['peak_rss_mb']}MB（ベースライン {base['peak_rss_mb']}MB）")
+    return regressions
+
+
+# データベースの接続を使い回す場合と、リクエストごとに接続し直す場合の比較
+
+def measure_connection_modes(iterations=200, conn_max_age=600, queries=3):
+    """
+    リクエストの開始・終了時の接続の扱い（close_old_connections）を再現しながら、
+    1リクエストあたり queries 回のクエリを iterations 回実行し、
+    CONN_MAX_AGE=0 と CONN_MAX_AGE=conn_max_age のレイテンシと接続回数を返す
+    """
+    settings_dict = connection.settings_dict
+    original = (settings_dict['CONN_MAX_AGE'], settings_dict['CONN_HEALTH_CHECKS'])
+    results = {}
+    for label, max_age in (('per-request', 0), ('persistent', conn_max_age)):
+        connects = []
+
+        def count_connect(sender, connection, **kwargs):
+            connects.append(connection.alias)
+
+        connection.close()
+        settings_dict['CONN_MAX_AGE'] = max_age
+        settings_dict['CONN_HEALTH_CHECKS'] = True
+        connection_created.connect(count_connect)
+        latencies = []
+        try:
+            for _ in range(iterations):
+                started = time.perf_counter()
+                # request_started と request_finished で行われる処理
+                close_old_connections()
+                for _ in range(queries):
+                    with connection.cursor() as cursor:
+                        cursor.execute('SELECT 1')
+                close_old_connections()
+                latencies.append((time.perf_counter() - started) * 1000)
+        finally:
+            connection_created.disconnect(count_connect)
+            settings_dict['CONN_MAX_AGE'], settings_dict['CONN_HEALTH_CHECKS'] = original
+            connection.close()
+        p50, p95, p99 = _percentiles(latencies)
+        results[label] = {
+            'conn_max_age': max_age,
+            'p50_ms': round(p50, 3),
+            'p95_ms': round(p95, 3),
+            'p99_ms': round(p99, 3),
+            'connects': len(connects),
+        }
+    return results
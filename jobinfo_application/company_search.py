@@ -0,0 +1,140 @@
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from .models import JobApplication
+
+
+class TTLCache:
+    """有効期限つきのLRUキャッシュ（スレッドセーフ）"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RateLimiter:
+    """トークンバケット方式で、外部APIへのリクエスト頻度を制限する"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """トークンを1つ消費できればTrue。待たずにすぐ返す"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def reset(self):
+        with self._lock:
+            self._tokens = float(self.burst)
+            self._updated_at = time.monotonic()
+
+
+def _build_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.COMPANY_SEARCH_POOL_SIZE)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['User-Agent'] = 'JobInfoManagement/1.0'
+    return session
+
+
+# ワーカープロセスごとに1つだけ作り、接続（TLSセッション）を使い回す
+_session = _build_session()
+_cache = TTLCache(maxsize=settings.COMPANY_SEARCH_CACHE_SIZE, ttl=settings.COMPANY_SEARCH_CACHE_TTL)
+_rate_limiter = RateLimiter(rate=settings.COMPANY_SEARCH_RATE_LIMIT, burst=settings.COMPANY_SEARCH_RATE_BURST)
+
+
+def normalize_query(name):
+    """全角・半角や大文字・小文字、空白の揺れを吸収したキャッシュキーを作る"""
+    name = unicodedata.normalize('NFKC', name)
+    return re.sub(r'\s+', ' ', name).strip().casefold()
+
+
+def search_wikidata(query):
+    """Wikidata APIで企業名を検索する。失敗時は requests.RequestException を送出"""
+    params = {"action": "wbsearchentities", "format": "json", "language": "ja", "type": "item", "search": query}
+    response = _session.get(settings.WIKIDATA_API_URL, params=params, timeout=settings.COMPANY_SEARCH_TIMEOUT)
+    response.raise_for_status()
+    data = response.json()
+    return [result.get('label') for result in data.get("search", []) if result.get('label')]
+
+
+def search_local(user, query, limit=10):
+    """
+    ユーザー自身が登録した応募情報の企業名から候補を探す（外部APIが使えないときの代替）。
+    他のユーザーの応募先がわからないよう、必ずユーザーで絞り込む
+    """
+    names = (
+        JobApplication.objects.filter(user=user, company_name__icontains=query)
+        .order_by('company_name')
+        .values_list('company_name', flat=True)
+        .distinct()[:limit]
+    )
+    return list(names)
+
+
+def search_companies(user, name):
+    """
+    企業名の候補を返す。
+    キャッシュにあればそれを返し、なければWikidataに問い合わせる。
+    Wikidataが遅い・使えない・リクエスト頻度の上限を超えた場合は、
+    user が登録済みの企業名から候補を返す（この結果はキャッシュしない）。
+    """
+    key = normalize_query(name)
+    names = _cache.get(key)
+    if names is not None:
+        return names
+    if _rate_limiter.acquire():
+        try:
+            names = search_wikidata(name.strip())
+        except (requests.exceptions.RequestException, ValueError):
+            names = None
+        if names is not None:
+            _cache.set(key, names)
+            return names
+    return search_local(user, name.strip())
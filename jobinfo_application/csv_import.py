@@ -0,0 +1,114 @@
+import csv
+import io
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import transaction
+
+from . import stats
+from .fragments import bump_fragment_version
+from .forms import JobApplicationForm, parse_job_type_names
+from .models import JobApplication, JobType
+from .search import document_value
+
+
+REQUIRED_COLUMNS = ('company_name', 'job_title')
+# エクスポートしたCSVの列名でも取り込めるようにする
+COLUMN_ALIASES = {'job_types': 'job_types_input'}
+# 画面に表示するエラーの件数の上限
+MAX_REPORTED_ERRORS = 100
+
+ImportResult = namedtuple('ImportResult', ['created', 'error_count', 'errors', 'committed'])
+
+
+class CSVImportError(Exception):
+    """CSVファイル全体を読み込めない場合のエラー（行ごとのエラーは ImportResult.errors に入る）"""
+
+
+def _form_errors(form):
+    return ' / '.join(
+        f"{form.fields[name].label if name in form.fields else name}: {' '.join(messages)}"
+        for name, messages in form.errors.items()
+    )
+
+
+def _insert_batch(batch):
+    """検証済みの行をまとめて登録し、職種カテゴリもまとめて紐づける"""
+    applications = JobApplication.objects.bulk_create([application for application, _ in batch])
+    names = {name for _, job_type_names in batch for name in job_type_names}
+    job_type_ids = JobType.objects.resolve_names(names)
+    through = JobApplication.job_types.through
+    through.objects.bulk_create([
+        through(jobapplication_id=application.pk, jobtype_id=job_type_ids[name])
+        for application, (_, job_type_names) in zip(applications, batch)
+        for name in job_type_names
+    ])
+    return len(applications)
+
+
+def _rows(reader):
+    try:
+        yield from reader
+    except UnicodeDecodeError:
+        raise CSVImportError(f"{reader.line_num + 1} 行目を読み込めません。ファイルをUTF-8で保存してください。")
+    except csv.Error as e:
+        raise CSVImportError(f"{reader.line_num} 行目の形式が正しくありません: {e}")
+
+
+def import_applications(user, lines, batch_size=None, skip_invalid=False):
+    """
+    CSVの行（文字列のイテレーター）を1行ずつ読み、JobApplicationForm で検証して応募情報を登録する。
+    登録は batch_size 件ごとに bulk_create で行い、全体を1つのトランザクションで囲む。
+    skip_invalid が偽の場合、1行でもエラーがあれば何も登録しない
+    """
+    batch_size = batch_size or settings.CSV_IMPORT_BATCH_SIZE
+    reader = csv.DictReader(lines)
+    try:
+        fieldnames = reader.fieldnames or []
+    except UnicodeDecodeError:
+        raise CSVImportError("ファイルを読み込めません。UTF-8で保存してください。")
+    columns = [COLUMN_ALIASES.get(name.strip(), name.strip()) for name in fieldnames]
+    missing = [name for name in REQUIRED_COLUMNS if name not in columns]
+    if missing:
+        raise CSVImportError(f"必須の列がありません: {', '.join(missing)}")
+    reader.fieldnames = columns
+
+    created = 0
+    error_count = 0
+    errors = []
+    with transaction.atomic():
+        batch = []
+        for row in _rows(reader):
+            form = JobApplicationForm(data={name: value for name, value in row.items() if name is not None})
+            if not form.is_valid():
+                error_count += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append((reader.line_num, _form_errors(form)))
+                continue
+            application = form.save(commit=False)
+            application.user = user
+            # bulk_create ではシグナルが送られないため、検索用の列もここで設定する
+            application.search_vector = document_value(application)
+            batch.append((application, parse_job_type_names(form.cleaned_data.get('job_types_input'))))
+            if len(batch) >= batch_size:
+                created += _insert_batch(batch)
+                batch = []
+        if batch:
+            created += _insert_batch(batch)
+
+        committed = skip_invalid or not error_count
+        if not committed:
+            transaction.set_rollback(True)
+            created = 0
+
+    if created:
+        stats.rebuild(user.pk)
+        # bulk_create ではシグナルが送られないため、一覧ページと今後の予定のキャッシュもここで古くする
+        bump_fragment_version(user.pk)
+    return ImportResult(created, error_count, errors, committed)
+
+
+def decode_upload(uploaded_file):
+    """アップロードされたファイルを、全体を読み込まずに1行ずつ文字列として読めるようにする（BOM付きUTF-8にも対応）"""
+    uploaded_file.seek(0)
+    return io.TextIOWrapper(uploaded_file.file, encoding='utf-8-sig', newline='')
@@ -0,0 +1,151 @@
+import hashlib
+import mimetypes
+import os
+import re
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, quote_etag
+
+
+SENDFILE_NGINX = 'x-accel-redirect'
+SENDFILE_APACHE = 'x-sendfile'
+# ASGIで送信する際に1回に読み込むバイト数
+STREAM_BLOCK_SIZE = 256 * 1024
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header, size):
+    """
+    Range ヘッダー（bytes=start-end の1範囲のみ対応）を (開始, 終了) の位置にする。
+    対応しない形式なら None を返し、ファイル全体を送る
+    """
+    match = _RANGE_RE.match(header.strip()) if header else None
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        # bytes=-500 は末尾の500バイト
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start > end or start >= size:
+        raise RangeNotSatisfiable
+    return start, end
+
+
+def document_etag(document):
+    """内容のSHA-256をETagにする。記録がない古い書類は、ファイル名・サイズ・更新日時から作る"""
+    if document.sha256:
+        return quote_etag(document.sha256)
+    storage, name = document.uploaded_file.storage, document.uploaded_file.name
+    stamp = f"{name}:{storage.size(name)}:{storage.get_modified_time(name).timestamp()}"
+    return quote_etag(hashlib.sha256(stamp.encode()).hexdigest())
+
+
+class _FileRange:
+    """ファイルの一部分だけを読めるようにするラッパー"""
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size) if size else b''
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+async def _aiter_file(file, block_size=STREAM_BLOCK_SIZE):
+    # ASGIでは同期のイテレーターは全体がメモリに読み込まれてから送信されるため、少しずつ読んで返す
+    read = sync_to_async(file.read, thread_sensitive=False)
+    try:
+        while chunk := await read(block_size):
+            yield chunk
+    finally:
+        await sync_to_async(file.close, thread_sensitive=False)()
+
+
+def _sendfile_response(name, path):
+    """ファイルの送信をWebサーバーに任せるレスポンス"""
+    response = HttpResponse()
+    if settings.DOCUMENT_SENDFILE_BACKEND == SENDFILE_NGINX:
+        response['X-Accel-Redirect'] = settings.DOCUMENT_SENDFILE_PREFIX.rstrip('/') + '/' + name
+    else:
+        response['X-Sendfile'] = path
+    return response
+
+
+def serve_document(request, document):
+    """
+    書類のファイルを返す。If-None-Match には 304、Range には 206 で応答する。
+    DOCUMENT_SENDFILE_BACKEND を設定すると、ファイルの送信は X-Accel-Redirect / X-Sendfile で
+    Webサーバーに任せ、Pythonのワーカーを占有しない
+    """
+    storage, name = document.uploaded_file.storage, document.uploaded_file.name
+    etag = document_etag(document)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = _file_response(request, storage, name, etag)
+        if response.status_code != 416:
+            # ファイル名は内容のハッシュなので、書類名で保存されるようにする
+            filename = document.name + os.path.splitext(name)[1]
+            response['Content-Type'] = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            response['Content-Disposition'] = content_disposition_header(False, filename)
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, max_age=settings.DOCUMENT_CACHE_MAX_AGE)
+    return response
+
+
+def _file_response(request, storage, name, etag):
+    if settings.DOCUMENT_SENDFILE_BACKEND:
+        # Range もWebサーバーが処理する
+        return _sendfile_response(name, storage.path(name))
+
+    size = storage.size(name)
+    byte_range = None
+    # If-Range が現在のETagと一致しない場合は、ファイル全体を送る
+    if request.headers.get('If-Range', etag) == etag:
+        try:
+            byte_range = parse_range(request.headers.get('Range'), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    file = storage.open(name, 'rb')
+    if byte_range is None:
+        start, length, status = 0, size, 200
+    else:
+        start, end = byte_range
+        length, status = end - start + 1, 206
+        file.seek(start)
+
+    if isinstance(request, ASGIRequest):
+        content = _aiter_file(_FileRange(file, length))
+        response = StreamingHttpResponse(content, status=status)
+    elif byte_range is None:
+        # WSGIサーバーの wsgi.file_wrapper が使えれば、sendfile でコピーせずに送信される
+        response = FileResponse(file)
+    else:
+        response = FileResponse(_FileRange(file, length), status=status)
+    response['Content-Length'] = length
+    response['Accept-Ranges'] = 'bytes'
+    if byte_range is not None:
+        response['Content-Range'] = f'bytes {start}-{start + length - 1}/{size}'
+    return response
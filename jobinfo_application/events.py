@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import CharField, F, Value
+from django.utils import timezone
+
+from .fragments import get_fragment_version
+from .models import InterviewLog, JobApplication
+
+
+KIND_TASK = 'task'
+KIND_INTERVIEW = 'interview'
+
+
+def _cache_key(user_id, version, today):
+    # データのバージョン（fragments.py）と日付をキーに含め、保存・削除や日付の変更で自動的に作り直す
+    return f'upcoming-events:{user_id}:{version}:{today.isoformat()}'
+
+
+def _query_upcoming_events(user_id, today, limit):
+    """応募情報のタスク期日と面接の実施日を、UNIONでまとめて日付順に取得する"""
+    columns = ('event_date', 'application_id', 'company', 'title', 'kind')
+    tasks = (
+        JobApplication.objects.filter(user_id=user_id, next_action_date__gte=today)
+        .annotate(
+            event_date=F('next_action_date'),
+            application_id=F('id'),
+            company=F('company_name'),
+            title=F('next_action'),
+            kind=Value(KIND_TASK, output_field=CharField()),
+        )
+        .values_list(*columns)
+        .order_by()
+    )
+    interviews = (
+        InterviewLog.objects.filter(job_application__user_id=user_id, interview_date__gte=today)
+        .annotate(
+            event_date=F('interview_date'),
+            application_id=F('job_application_id'),
+            company=F('job_application__company_name'),
+            title=F('stage'),
+            kind=Value(KIND_INTERVIEW, output_field=CharField()),
+        )
+        .values_list(*columns)
+        .order_by()
+    )
+    rows = tasks.union(interviews, all=True).order_by('event_date', 'company')[:limit]
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def get_upcoming_events(user, limit=None, version=None):
+    """
+    今日以降の予定（タスクの期日と面接の実施日）を日付の早い順に最大 limit 件返す。
+    結果はユーザーのデータのバージョンごとにキャッシュする（version を取得済みなら渡す）
+    """
+    limit = limit or settings.UPCOMING_EVENTS_LIMIT
+    today = timezone.localdate()
+    if version is None:
+        version = get_fragment_version(user)
+    key = _cache_key(user.pk, version, today)
+    cached = cache.get(key)
+    # 多めに取得済みのキャッシュは、少ない件数の要求にもそのまま使える
+    if cached is not None and (cached['limit'] >= limit or len(cached['events']) < cached['limit']):
+        return cached['events'][:limit]
+    events = _query_upcoming_events(user.pk, today, limit)
+    cache.set(key, {'limit': limit, 'events': events}, settings.UPCOMING_EVENTS_CACHE_TIMEOUT)
+    return events
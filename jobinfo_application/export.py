@@ -0,0 +1,156 @@
+import csv
+import datetime
+import itertools
+import json
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .models import Document, EntrySheet, InterviewLog, JobApplication
+
+
+FORMAT_CSV = 'csv'
+FORMAT_NDJSON = 'ndjson'
+FORMATS = (FORMAT_CSV, FORMAT_NDJSON)
+# 非同期で送信する際に、1回にまとめて読み進める行数
+STREAM_BATCH_LINES = 200
+CONTENT_TYPES = {
+    FORMAT_CSV: 'text/csv; charset=utf-8',
+    FORMAT_NDJSON: 'application/x-ndjson; charset=utf-8',
+}
+
+APPLICATION_FIELDS = (
+    'id', 'company_name', 'job_title', 'status', 'next_action', 'next_action_date',
+    'corporate_philosophy', 'ideal_candidate', 'job_description', 'notes', 'applied_at',
+)
+# 応募情報ごとにまとめて出力する関連データ: (キー, モデル, 出力する列, 並び順)
+RELATED = (
+    ('interview_logs', InterviewLog,
+     ('stage', 'interview_date', 'questions_asked', 'self_evaluation', 'next_steps'), ('interview_date', 'id')),
+    ('entry_sheets', EntrySheet, ('question', 'answer', 'ai_draft', 'updated_at'), ('id',)),
+    ('documents', Document, ('name', 'uploaded_file', 'uploaded_at'), ('id',)),
+)
+CSV_COLUMNS = APPLICATION_FIELDS + ('job_types',) + tuple(key for key, *_ in RELATED)
+
+
+def _jsonable(value):
+    return value.isoformat() if isinstance(value, (datetime.date, datetime.datetime)) else value
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+def _group_related(model, fields, ordering, application_ids):
+    grouped = defaultdict(list)
+    rows = (
+        model.objects.filter(job_application_id__in=application_ids)
+        .order_by(*ordering)
+        .values_list('job_application_id', *fields)
+    )
+    for application_id, *values in rows:
+        grouped[application_id].append({name: _jsonable(value) for name, value in zip(fields, values)})
+    return grouped
+
+
+def _group_job_types(application_ids):
+    grouped = defaultdict(list)
+    rows = (
+        JobApplication.job_types.through.objects.filter(jobapplication_id__in=application_ids)
+        .order_by('jobtype__name')
+        .values_list('jobapplication_id', 'jobtype__name')
+    )
+    for application_id, name in rows:
+        grouped[application_id].append(name)
+    return grouped
+
+
+def iter_records(user_id, chunk_size=None):
+    """
+    ユーザーの応募情報を1件ずつ、面接ログ・ES設問・書類の情報と職種カテゴリを含めた辞書として返す。
+    応募情報はサーバー側カーソルで chunk_size 件ずつ読み込み、関連データはその単位でまとめて取得する。
+    件数が多くても一度に保持するのは1チャンク分だけなので、メモリ使用量は一定になる
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    applications = (
+        JobApplication.objects.filter(user_id=user_id)
+        .order_by('id')
+        .values_list(*APPLICATION_FIELDS)
+        .iterator(chunk_size=chunk_size)
+    )
+    for batch in _batches(applications, chunk_size):
+        application_ids = [row[0] for row in batch]
+        job_types = _group_job_types(application_ids)
+        related = {
+            key: _group_related(model, fields, ordering, application_ids)
+            for key, model, fields, ordering in RELATED
+        }
+        for row in batch:
+            record = {name: _jsonable(value) for name, value in zip(APPLICATION_FIELDS, row)}
+            record['job_types'] = job_types.get(row[0], [])
+            for key in related:
+                record[key] = related[key].get(row[0], [])
+            yield record
+
+
+class _Echo:
+    """csv.writer の書き込み先。書き込まれた行をそのまま返す"""
+
+    def write(self, value):
+        return value
+
+
+def iter_ndjson(records):
+    for record in records:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def iter_csv(records):
+    """
+    1行に1件の応募情報を出力する。職種カテゴリはカンマ区切り、
+    面接ログ・ES設問・書類はJSON文字列として1つの列に入れる
+    """
+    writer = csv.writer(_Echo())
+    # Excelで文字化けしないよう、先頭にBOMを付ける
+    yield '\ufeff' + writer.writerow(CSV_COLUMNS)
+    for record in records:
+        row = [record[name] for name in APPLICATION_FIELDS]
+        row.append(', '.join(record['job_types']))
+        for name, *_ in RELATED:
+            row.append(json.dumps(record[name], ensure_ascii=False))
+        yield writer.writerow(row)
+
+
+def iter_export(user_id, export_format=FORMAT_CSV, chunk_size=None):
+    """指定した形式でエクスポートの内容を少しずつ返す"""
+    records = iter_records(user_id, chunk_size=chunk_size)
+    try:
+        yield from iter_ndjson(records) if export_format == FORMAT_NDJSON else iter_csv(records)
+    finally:
+        records.close()
+
+
+def _take(lines, size):
+    return ''.join(itertools.islice(lines, size))
+
+
+async def aiter_export(user_id, export_format=FORMAT_CSV, chunk_size=None):
+    """
+    ASGIで送信するための非同期版。
+    （ASGIでは同期のイテレーターは全体がメモリに読み込まれてから送信されるため）
+    データベースの読み込みはスレッドで行い、数百行ずつまとめて返す
+    """
+    lines = iter_export(user_id, export_format, chunk_size=chunk_size)
+    take = sync_to_async(_take)
+    try:
+        while True:
+            part = await take(lines, STREAM_BATCH_LINES)
+            if not part:
+                break
+            yield part
+    finally:
+        # 途中で接続が切れた場合も、サーバー側カーソルを閉じる
+        await sync_to_async(lines.close)()
@@ -0,0 +1,146 @@
+import datetime
+import logging
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import extractors
+from .models import Document
+from .search import document_value
+
+logger = logging.getLogger(__name__)
+
+
+def _claim_pending(limit):
+    """抽出待ちの書類を最大 limit 件取り出して抽出中にする。他のワーカーが処理中の行は飛ばす"""
+    with transaction.atomic():
+        documents = list(
+            Document.objects.select_for_update(skip_locked=True)
+            .filter(extraction_status=Document.EXTRACTION_PENDING)
+            .only('id', 'name', 'uploaded_file', 'sha256', 'extracted_sha256')
+            .order_by('id')[:limit]
+        )
+        Document.objects.filter(pk__in=[document.pk for document in documents]).update(
+            extraction_status=Document.EXTRACTION_RUNNING, extraction_started_at=timezone.now()
+        )
+    return documents
+
+
+def _save_result(document, status, sha256, text):
+    """抽出結果を保存する。抽出中にファイルが差し替えられて抽出待ちに戻っていれば保存しない"""
+    document.extraction_status = status
+    document.extracted_text = text
+    document.extracted_sha256 = sha256
+    document.sha256 = document.sha256 or sha256
+    return Document.objects.filter(pk=document.pk, extraction_status=Document.EXTRACTION_RUNNING).update(
+        extraction_status=status,
+        extracted_text=text,
+        extracted_sha256=sha256,
+        sha256=document.sha256,
+        search_vector=document_value(document),
+    )
+
+
+def _reuse_extracted(document):
+    """同じファイルを共有する別の書類で抽出済みなら、その結果を使う"""
+    if not document.sha256:
+        return False
+    extracted = (
+        Document.objects.filter(
+            uploaded_file=document.uploaded_file.name,
+            extracted_sha256=document.sha256,
+            extraction_status__in=(Document.EXTRACTION_DONE, Document.EXTRACTION_UNSUPPORTED),
+        )
+        .values_list('extraction_status', 'extracted_text')
+        .first()
+    )
+    if extracted is None:
+        return False
+    _save_result(document, extracted[0], document.sha256, extracted[1])
+    return True
+
+
+def worker_pool(max_workers=None):
+    """本文を抽出するプロセスのプール。起動に時間がかかるため、ワーカー（run_extraction_worker）の間は使い回す"""
+    # fork したプロセスがデータベースの接続を共有しないよう、spawn で起動する
+    return ProcessPoolExecutor(
+        max_workers=max_workers or settings.DOCUMENT_EXTRACTION_WORKERS, mp_context=multiprocessing.get_context('spawn')
+    )
+
+
+def _extract_in_pool(pool, pending, timeout, counts):
+    """pending の書類を pool で抽出して保存する。プールのプロセスが異常終了していれば True を返す"""
+    try:
+        futures = {
+            pool.submit(
+                extractors.extract_file,
+                document.uploaded_file.path,
+                timeout,
+                settings.DOCUMENT_EXTRACTION_MAX_CHARS,
+                document.sha256,
+            ): document
+            for document in pending
+        }
+    except BrokenProcessPool:
+        # 前の抽出の後でプロセスが異常終了していた。取り出した書類は抽出待ちに戻す
+        Document.objects.filter(
+            pk__in=[document.pk for document in pending], extraction_status=Document.EXTRACTION_RUNNING
+        ).update(extraction_status=Document.EXTRACTION_PENDING)
+        return True
+
+    broken = False
+    for future in as_completed(futures):
+        document = futures[future]
+        try:
+            status, sha256, text, error = future.result()
+        except BrokenProcessPool as e:
+            # ワーカープロセスが異常終了した（メモリ不足など）
+            broken = True
+            status, sha256, text, error = extractors.STATUS_FAILED, document.sha256, '', str(e)
+        if error:
+            logger.warning('Text extraction for document %s: %s', document.pk, error)
+        _save_result(document, status, sha256, text)
+        counts[status] += 1
+    return broken
+
+
+def extract_pending(pool=None, max_workers=None, timeout=None, batch_size=None):
+    """
+    抽出待ちの書類を最大 batch_size 件取り出し、ワーカープロセスで並列に本文を抽出して保存する。
+    pool を渡さなければ、この呼び出しの間だけプールを作る。
+    1ファイルの抽出が timeout 秒を超えたら失敗にする。
+    処理した件数を状態ごとに Counter で返す（'reused' は抽出済みの結果を使った件数）。
+    渡された pool のプロセスが異常終了して使えなくなった場合は、結果を保存した後で BrokenProcessPool を送出する
+    """
+    max_workers = max_workers or settings.DOCUMENT_EXTRACTION_WORKERS
+    timeout = timeout or settings.DOCUMENT_EXTRACTION_TIMEOUT
+    batch_size = batch_size or max_workers * 4
+    counts = Counter()
+
+    pending = []
+    for document in _claim_pending(batch_size):
+        if _reuse_extracted(document):
+            counts['reused'] += 1
+        else:
+            pending.append(document)
+    if not pending:
+        return counts
+    if pool is None:
+        with worker_pool(min(max_workers, len(pending))) as pool:
+            _extract_in_pool(pool, pending, timeout, counts)
+    elif _extract_in_pool(pool, pending, timeout, counts):
+        raise BrokenProcessPool('抽出中にワーカープロセスが異常終了しました。')
+    return counts
+
+
+def requeue_stale_extractions():
+    """ワーカーが途中で停止して抽出中のまま残った書類を、抽出待ちに戻す"""
+    threshold = timezone.now() - datetime.timedelta(seconds=settings.DOCUMENT_EXTRACTION_STALE_AFTER)
+    return Document.objects.filter(
+        extraction_status=Document.EXTRACTION_RUNNING, extraction_started_at__lt=threshold
+    ).update(extraction_status=Document.EXTRACTION_PENDING)
@@ -0,0 +1,110 @@
+"""
+書類のファイルから本文を取り出す処理。
+
+run_extraction_worker のワーカープロセス（spawn で起動する）の中で実行するため、
+このモジュールはDjangoの設定やモデルに依存しない。
+"""
+import hashlib
+import os
+import signal
+import zipfile
+from xml.etree import ElementTree
+
+
+STATUS_DONE = 'done'
+STATUS_UNSUPPORTED = 'unsupported'
+STATUS_FAILED = 'failed'
+
+READ_BLOCK_SIZE = 64 * 1024
+# テキストファイルの文字コードの候補（Windowsで作成した日本語のファイルはShift_JISのことが多い）
+TEXT_ENCODINGS = ('utf-8-sig', 'cp932')
+
+_WORD_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+
+class ExtractionTimeout(Exception):
+    pass
+
+
+def _raise_timeout(signum, frame):
+    raise ExtractionTimeout
+
+
+def _read_text(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    for encoding in TEXT_ENCODINGS:
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode('utf-8', errors='replace')
+
+
+def _read_docx(path):
+    """word/document.xml の段落ごとにテキストを取り出す（python-docx を使わずに標準ライブラリで読む）"""
+    paragraphs = []
+    with zipfile.ZipFile(path) as archive, archive.open('word/document.xml') as xml:
+        for _, element in ElementTree.iterparse(xml):
+            if element.tag == f'{_WORD_NS}p':
+                texts = []
+                for node in element.iter():
+                    if node.tag == f'{_WORD_NS}t' and node.text:
+                        texts.append(node.text)
+                    elif node.tag == f'{_WORD_NS}tab':
+                        texts.append('\t')
+                paragraphs.append(''.join(texts))
+                # 読み終えた段落は捨て、大きな文書でもメモリを使いすぎないようにする
+                element.clear()
+    return '\n'.join(paragraphs)
+
+
+def _read_pdf(path):
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    return '\n'.join(page.extract_text() or '' for page in reader.pages)
+
+
+EXTRACTORS = {
+    'pdf': _read_pdf,
+    'docx': _read_docx,
+    'txt': _read_text,
+}
+
+
+def file_sha256(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while block := f.read(READ_BLOCK_SIZE):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def extract_file(path, timeout, max_chars, sha256=''):
+    """
+    ファイルから本文を取り出し、(状態, SHA-256, 本文, エラー) を返す。
+    timeout 秒を超えたら打ち切る（SIGALRMを使うため、プロセスのメインスレッドで呼び出す）
+    """
+    extension = os.path.splitext(path)[1].lstrip('.').lower()
+    extractor = EXTRACTORS.get(extension)
+    previous_handler = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        # ハッシュが記録されていない古い書類は、ここで計算する
+        sha256 = sha256 or file_sha256(path)
+        if extractor is None:
+            return STATUS_UNSUPPORTED, sha256, '', ''
+        text = extractor(path)
+    except ExtractionTimeout:
+        return STATUS_FAILED, sha256, '', f'{timeout}秒以内に抽出できませんでした。'
+    except ImportError as e:
+        # pypdf がインストールされていない環境
+        return STATUS_UNSUPPORTED, sha256, '', str(e)
+    except Exception as e:
+        return STATUS_FAILED, sha256, '', f'{type(e).__name__}: {e}'
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+    # PostgreSQLのテキスト列に保存できないNUL文字を除く
+    return STATUS_DONE, sha256, text.replace('\x00', '')[:max_chars], ''
@@ -2,6 +2,7 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from .models import JobApplication, Document, UserProfile, InterviewLog, EntrySheet
+from .uploads import UploadError, check_uploaded_file
 
 class SignUpForm(UserCreationForm):
     email = forms.EmailField(
@@ -14,6 +15,12 @@ class SignUpForm(UserCreationForm):
         fields = ('username', 'email')
 
 
+def parse_job_type_names(job_types_str):
+    """カンマ区切りの職種カテゴリを、順序を保ったまま重複なしのリストにする"""
+    names = (name.strip() for name in (job_types_str or '').split(','))
+    return list(dict.fromkeys(name for name in names if name))
+
+
 class JobApplicationForm(forms.ModelForm):
     job_types_input = forms.CharField(
         required=False,
@@ -42,6 +49,63 @@ class JobApplicationForm(forms.ModelForm):
                 self.fields['job_types_input'].initial = ', '.join([job.name for job in self.instance.job_types.all()])
 
 
+class ApplicationFilterForm(forms.Form):
+    """応募一覧の絞り込み条件"""
+    status = forms.ChoiceField(
+        required=False,
+        label="選考ステージ",
+        choices=[('', 'すべて')] + JobApplication.STATUS_CHOICES
+    )
+    job_types = forms.CharField(
+        required=False,
+        label="職種カテゴリ",
+        help_text="カンマ区切りで複数指定できます。"
+    )
+    next_action_date_from = forms.DateField(
+        required=False,
+        label="期日（から）",
+        widget=forms.DateInput(attrs={'type': 'date'})
+    )
+    next_action_date_to = forms.DateField(
+        required=False,
+        label="期日（まで）",
+        widget=forms.DateInput(attrs={'type': 'date'})
+    )
+
+    def clean_job_types(self):
+        # 登録・更新時と同じ規則で分割する
+        return parse_job_type_names(self.cleaned_data.get('job_types'))
+
+    def filter_queryset(self, queryset):
+        """検証済みの条件をクエリセットに適用する"""
+        data = self.cleaned_data
+        if data.get('status'):
+            queryset = queryset.filter(status=data['status'])
+        if data.get('job_types'):
+            # JOINで行が重複しないよう、中間テーブルへのサブクエリで絞り込む
+            through = JobApplication.job_types.through
+            tagged_ids = through.objects.filter(jobtype__name__in=data['job_types']).values('jobapplication_id')
+            queryset = queryset.filter(id__in=tagged_ids)
+        if data.get('next_action_date_from'):
+            queryset = queryset.filter(next_action_date__gte=data['next_action_date_from'])
+        if data.get('next_action_date_to'):
+            queryset = queryset.filter(next_action_date__lte=data['next_action_date_to'])
+        return queryset
+
+
+class CSVImportForm(forms.Form):
+    """応募情報をCSVファイルから一括登録するためのフォーム"""
+    csv_file = forms.FileField(
+        label="CSVファイル",
+        help_text="1行目に列名（company_name, job_title, status, job_types など）を入れてください。"
+    )
+    skip_invalid = forms.BooleanField(
+        required=False,
+        label="エラーのある行を飛ばして登録する",
+        help_text="チェックしない場合、1行でもエラーがあれば何も登録しません。"
+    )
+
+
 class InterviewLogForm(forms.ModelForm):
     """面接ログを登録・編集するためのフォーム"""
     class Meta:
@@ -73,6 +137,17 @@ class DocumentForm(forms.ModelForm):
             'uploaded_file': forms.FileInput(attrs={'class': 'form-control'}),
         }
 
+    def clean_uploaded_file(self):
+        uploaded_file = self.cleaned_data['uploaded_file']
+        try:
+            self.instance.sha256 = check_uploaded_file(uploaded_file)
+        except UploadError as e:
+            raise forms.ValidationError(str(e))
+        self.instance.size = uploaded_file.size
+        # 保存時にストレージがもう一度ファイルを読まずに済むよう、計算済みのハッシュを渡す
+        uploaded_file.sha256 = self.instance.sha256
+        return uploaded_file
+
 
 class UserProfileForm(forms.ModelForm):
     class Meta:
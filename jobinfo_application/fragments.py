@@ -0,0 +1,37 @@
+"""
+ページの断片キャッシュ（テンプレートの {% cache %}）のキーに含める、ユーザーごとのデータのバージョン。
+
+応募情報・面接ログ・ES設問・書類を保存・削除するとそのユーザーのバージョンが上がり（signals.py）、
+古い断片は使われなくなる（キャッシュからは TEMPLATE_FRAGMENT_CACHE_TIMEOUT で消える）。
+バージョンはキャッシュではなくデータベース（UserProfile.data_version）に保存しているため、
+プロセスごとのキャッシュ（locmem）でも、別のプロセスやワーカーでの変更が反映される。
+"""
+from django.conf import settings
+from django.db.models import F
+
+from .models import UserProfile
+
+
+def get_fragment_version(user):
+    """ユーザーのデータのバージョン。プロフィールがまだなければ作る"""
+    try:
+        return UserProfile.objects.values_list('data_version', flat=True).get(user=user)
+    except UserProfile.DoesNotExist:
+        return UserProfile.objects.for_user(user).data_version
+
+
+def bump_fragment_version(user_id):
+    """
+    ユーザーの断片キャッシュを古くする。
+    トランザクションの中で呼ぶと、確定するまで他のプロセスからは前のバージョンに見える（確定前の内容で作った断片は前のバージョンのキーに入る）
+    """
+    # プロフィールがまだない場合は、次に使うときに作られる新しいバージョンになる
+    UserProfile.objects.filter(user_id=user_id).update(data_version=F('data_version') + 1)
+
+
+def fragment_context(user):
+    """{% cache fragment_timeout '名前' ... fragment_version %} で使う値"""
+    return {
+        'fragment_version': get_fragment_version(user),
+        'fragment_timeout': settings.TEMPLATE_FRAGMENT_CACHE_TIMEOUT,
+    }
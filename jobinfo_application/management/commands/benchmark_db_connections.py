@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from jobinfo_application import benchmark
+
+
+class Command(BaseCommand):
+    help = "データベースの接続をリクエストごとに作る場合と使い回す場合の、1リクエストあたりのレイテンシを比べる"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200, help="再現するリクエストの回数")
+        parser.add_argument('--queries', type=int, default=3, help="1リクエストあたりのクエリ数")
+        parser.add_argument('--conn-max-age', type=int, default=600, help="使い回す場合の CONN_MAX_AGE")
+
+    def handle(self, *args, **options):
+        results = benchmark.measure_connection_modes(
+            iterations=options['iterations'], conn_max_age=options['conn_max_age'], queries=options['queries'],
+        )
+        host = connection.settings_dict.get('HOST') or connection.settings_dict.get('NAME')
+        self.stdout.write(f"{connection.vendor} ({host}), {options['iterations']} requests x {options['queries']} queries")
+        self.stdout.write(f"{'mode':<14}{'CONN_MAX_AGE':>14}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'connects':>10}")
+        for label, result in results.items():
+            self.stdout.write(
+                f"{label:<14}{result['conn_max_age']:>14}{result['p50_ms']:>10}{result['p95_ms']:>10}"
+                f"{result['p99_ms']:>10}{result['connects']:>10}"
+            )
+        per_request, persistent = results['per-request'], results['persistent']
+        self.stdout.write(self.style.SUCCESS(
+            f"1リクエストあたりの差（p50）: {per_request['p50_ms'] - persistent['p50_ms']:.3f}ms"
+        ))
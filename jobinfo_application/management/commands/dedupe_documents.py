@@ -0,0 +1,84 @@
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from jobinfo_application.models import Document, DocumentBlob
+from jobinfo_application.storage import BLOB_PREFIX, blob_name, document_storage, lock_blob
+from jobinfo_application.uploads import hash_file
+
+
+def _format_size(size):
+    return f"{size / (1024 * 1024):.1f}MB"
+
+
+class Command(BaseCommand):
+    help = "保存済みの書類のファイルを内容のSHA-256で保存し直し、同じ内容のファイルを1つにまとめる"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="削減できる容量を表示するだけで、ファイルは変更しない")
+
+    def handle(self, *args, **options):
+        storage = document_storage
+        dry_run = options['dry_run']
+        seen_blobs = set()
+        scanned = duplicates = missing = saved = 0
+
+        names = (
+            Document.objects.exclude(uploaded_file__startswith=BLOB_PREFIX + '/').exclude(uploaded_file='')
+            .order_by('uploaded_file').values_list('uploaded_file', flat=True).distinct()
+        )
+        for name in names.iterator():
+            if not storage.exists(name):
+                missing += 1
+                self.stdout.write(self.style.WARNING(f"ファイルがありません: {name}"))
+                continue
+            scanned += 1
+            size = storage.size(name)
+            with storage.open(name, 'rb') as f:
+                sha256 = hash_file(f).hexdigest()
+            blob = blob_name(sha256, os.path.splitext(name)[1])
+            if storage.exists(blob) or blob in seen_blobs:
+                duplicates += 1
+                saved += size
+            seen_blobs.add(blob)
+            if dry_run:
+                continue
+
+            with transaction.atomic():
+                # 書類の削除に伴うファイルの削除（signals.py）や、同じ内容のファイルの使い回し（storage.py）と
+                # 重ならないよう、移動元と移動先の両方をロックしてから移す
+                for locked in sorted({name, blob}):
+                    lock_blob(locked)
+                if not storage.exists(name):
+                    continue
+                if not storage.exists(blob):
+                    os.makedirs(os.path.dirname(storage.path(blob)), exist_ok=True)
+                    os.replace(storage.path(name), storage.path(blob))
+                Document.objects.filter(uploaded_file=name).update(uploaded_file=blob, sha256=sha256, size=size)
+                if storage.exists(name):
+                    storage.delete(name)
+                DocumentBlob.objects.filter(name=name).delete()
+
+        self.stdout.write(
+            f"確認したファイル: {scanned} 件 / 重複: {duplicates} 件 / 見つからないファイル: {missing} 件"
+        )
+        verb = "削減できる容量" if dry_run else "削減した容量"
+        self.stdout.write(self.style.SUCCESS(f"{verb}: {_format_size(saved)}（{saved} バイト）"))
+        if not dry_run:
+            self._report_usage(storage)
+
+    def _report_usage(self, storage):
+        """書類の合計サイズと、実際に保存しているファイルの合計サイズ"""
+        documents = logical = 0
+        sizes = {}
+        for name, size in Document.objects.exclude(uploaded_file='').values_list('uploaded_file', 'size').iterator():
+            if size is None:
+                size = storage.size(name) if storage.exists(name) else 0
+            documents += 1
+            logical += size
+            sizes[name] = size
+        self.stdout.write(
+            f"書類 {documents} 件（合計 {_format_size(logical)}）を "
+            f"{len(sizes)} ファイル（{_format_size(sum(sizes.values()))}）で保存しています。"
+        )
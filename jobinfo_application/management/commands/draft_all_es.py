@@ -0,0 +1,85 @@
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+
+from jobinfo_application import ai
+from jobinfo_application.models import JobApplication
+from jobinfo_application.tasks import draft_all_unanswered
+
+
+class _LatencyClient:
+    """ベンチマーク用の偽のOpenAIクライアント。一定時間待ってから固定の回答を返す"""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        time.sleep(self.latency)
+        message = SimpleNamespace(content="ベンチマーク用の回答です。")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+class Command(BaseCommand):
+    help = "応募情報の未回答のES設問すべてについて、AIによる回答ドラフトを並行して生成する"
+
+    def add_arguments(self, parser):
+        parser.add_argument('application_id', nargs='?', type=int, help="対象の応募情報のID")
+        parser.add_argument('--workers', type=int, default=None, help="同時に呼び出すAPIリクエストの上限")
+        parser.add_argument('--regenerate', action='store_true', help="キャッシュを使わずに生成する")
+        parser.add_argument(
+            '--benchmark', action='store_true',
+            help="偽のクライアントで、逐次処理と並行処理の所要時間を比較する（データベースは変更しない）"
+        )
+        parser.add_argument('--questions', type=int, default=8, help="ベンチマークの設問数")
+        parser.add_argument('--latency', type=float, default=0.5, help="ベンチマークで1回のAPI呼び出しにかかる秒数")
+
+    def handle(self, *args, **options):
+        if options['benchmark']:
+            return self._benchmark(options)
+        if options['application_id'] is None:
+            raise CommandError("応募情報のIDを指定してください。")
+        try:
+            job_application = JobApplication.objects.select_related('user__profile').get(pk=options['application_id'])
+        except JobApplication.DoesNotExist:
+            raise CommandError(f"応募情報 {options['application_id']} は存在しません。")
+
+        results = draft_all_unanswered(
+            job_application, regenerate=options['regenerate'], max_workers=options['workers']
+        )
+        if not results:
+            self.stdout.write("未回答のES設問はありません。")
+            return
+        failures = 0
+        for result in results:
+            question = result['entry_sheet'].question[:30]
+            if result['error'] is not None:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f"[失敗] {question}: {result['error']}"))
+            else:
+                source = "キャッシュ" if result['cached'] else "生成"
+                self.stdout.write(f"[{source}] {question}")
+        self.stdout.write(self.style.SUCCESS(f"{len(results) - failures} / {len(results)} 件のドラフトを保存しました。"))
+
+    def _benchmark(self, options):
+        client = _LatencyClient(options['latency'])
+        context = ("スキル: Python", "企業名: ベンチマーク株式会社")
+        messages_list = [ai.build_messages(f"設問{i}", context) for i in range(options['questions'])]
+        workers = options['workers'] or 4
+
+        timings = {}
+        for label, max_workers in (('sequential', 1), ('concurrent', workers)):
+            started = time.perf_counter()
+            responses = ai.request_drafts(client, messages_list, max_workers)
+            timings[label] = time.perf_counter() - started
+            errors = [r for r in responses if isinstance(r, Exception)]
+            if errors:
+                raise CommandError(f"ベンチマーク中にエラーが発生しました: {errors[0]}")
+
+        self.stdout.write(
+            f"questions={options['questions']} latency={options['latency']}s workers={workers}\n"
+            f"sequential: {timings['sequential']:.3f}s\n"
+            f"concurrent: {timings['concurrent']:.3f}s\n"
+            f"speedup:    {timings['sequential'] / timings['concurrent']:.1f}x"
+        )
@@ -0,0 +1,102 @@
+import datetime
+import sys
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from jobinfo_application import export
+from jobinfo_application.models import EntrySheet, InterviewLog, JobApplication
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "ユーザーの応募履歴すべてを CSV または NDJSON で書き出す"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', nargs='?', help="対象のユーザー名")
+        parser.add_argument('--format', choices=export.FORMATS, default=export.FORMAT_CSV)
+        parser.add_argument('--output', help="出力先のファイル（省略時は標準出力）")
+        parser.add_argument('--chunk-size', type=int, default=None, help="一度にデータベースから読み込む件数")
+        parser.add_argument(
+            '--benchmark', action='store_true',
+            help="合成データを作ってエクスポートの所要時間とメモリ使用量を測る（データベースは変更しない）"
+        )
+        parser.add_argument('--rows', type=int, default=100_000, help="ベンチマークの応募情報の件数")
+
+    def handle(self, *args, **options):
+        if options['benchmark']:
+            return self._benchmark(options)
+        if not options['username']:
+            raise CommandError("ユーザー名を指定してください。")
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"ユーザー {options['username']} は存在しません。")
+
+        lines = export.iter_export(user.pk, options['format'], chunk_size=options['chunk_size'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as f:
+                f.writelines(lines)
+        else:
+            sys.stdout.writelines(lines)
+
+    def _create_synthetic_rows(self, username, rows):
+        user = User.objects.create_user(username=username)
+        today = datetime.date.today()
+        batch_size = 2000
+        for start in range(0, rows, batch_size):
+            applications = JobApplication.objects.bulk_create([
+                JobApplication(
+                    user=user, company_name=f"企業{i}", job_title="エンジニア", status='選考中',
+                    job_description="業務内容" * 50, notes="メモ" * 20,
+                )
+                for i in range(start, min(start + batch_size, rows))
+            ])
+            InterviewLog.objects.bulk_create([
+                InterviewLog(job_application=application, stage="一次面接", interview_date=today, questions_asked="質問" * 50)
+                for application in applications
+            ])
+            EntrySheet.objects.bulk_create([
+                EntrySheet(job_application=application, question="志望動機", answer="回答" * 200)
+                for application in applications
+            ])
+        return user
+
+    def _measure(self, user, options):
+        tracemalloc.start()
+        started = time.perf_counter()
+        size = 0
+        for line in export.iter_export(user.pk, options['format'], chunk_size=options['chunk_size']):
+            size += len(line)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return elapsed, peak, size
+
+    def _benchmark(self, options):
+        rows = options['rows']
+        results = []
+        try:
+            with transaction.atomic():
+                # 件数を10倍にしてもメモリ使用量が増えないことを確かめる
+                for label, count in (('small', max(rows // 10, 1)), ('large', rows)):
+                    started = time.perf_counter()
+                    user = self._create_synthetic_rows(f"export-benchmark-{label}", count)
+                    self.stdout.write(f"{label}: {count} 件の合成データを作成 ({time.perf_counter() - started:.1f}s)")
+                    results.append((label, count, *self._measure(user, options)))
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        self.stdout.write(f"format={options['format']} chunk_size={options['chunk_size'] or 'default'}")
+        for label, count, elapsed, peak, size in results:
+            self.stdout.write(
+                f"{label:5}: rows={count} time={elapsed:.2f}s ({count / elapsed:,.0f} rows/s) "
+                f"output={size / 1e6:.1f}M chars peak_memory={peak / 1e6:.1f}MB"
+            )
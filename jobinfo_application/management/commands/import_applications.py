@@ -0,0 +1,40 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from jobinfo_application.csv_import import CSVImportError, import_applications
+
+
+class Command(BaseCommand):
+    help = "CSVファイルから応募情報を一括登録する"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help="登録先のユーザー名")
+        parser.add_argument('csv_file', help="CSVファイルのパス（UTF-8）")
+        parser.add_argument('--batch-size', type=int, default=None, help="一度に bulk_create する件数")
+        parser.add_argument('--skip-invalid', action='store_true', help="エラーのある行を飛ばして登録する")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"ユーザー {options['username']} は存在しません。")
+
+        started = time.perf_counter()
+        try:
+            with open(options['csv_file'], encoding='utf-8-sig', newline='') as f:
+                result = import_applications(
+                    user, f, batch_size=options['batch_size'], skip_invalid=options['skip_invalid']
+                )
+        except (CSVImportError, OSError) as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+
+        for line, message in result.errors:
+            self.stderr.write(f"{line} 行目: {message}")
+        if not result.committed:
+            raise CommandError(f"{result.error_count} 行にエラーがあったため、何も登録していません。")
+        self.stdout.write(self.style.SUCCESS(
+            f"{result.created} 件を登録しました（エラー {result.error_count} 行, {elapsed:.2f}s）。"
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from jobinfo_application.ai_cache import evict
+
+
+class Command(BaseCommand):
+    help = "AIの応答キャッシュから、期限切れの応答と上限件数を超えた応答を削除する"
+
+    def handle(self, *args, **options):
+        count = evict()
+        self.stdout.write(self.style.SUCCESS(f"{count} 件の応答を削除しました。"))
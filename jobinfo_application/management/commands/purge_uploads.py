@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from jobinfo_application.uploads import purge_expired_uploads
+
+
+class Command(BaseCommand):
+    help = "一定時間更新のない書類の分割アップロードのセッションと一時ファイルを削除する"
+
+    def handle(self, *args, **options):
+        count = purge_expired_uploads()
+        self.stdout.write(self.style.SUCCESS(f"{count} 件のセッションを削除しました。"))
@@ -0,0 +1,41 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from jobinfo_application import stats
+
+
+class Command(BaseCommand):
+    help = "ダッシュボードの集計を、応募情報と面接ログからゼロから作り直す（--check でずれの確認のみ）"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="対象のユーザー名（省略時は全ユーザー）")
+        parser.add_argument('--check', action='store_true', help="集計のずれを表示するだけで、書き換えない")
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['user']:
+            users = users.filter(username=options['user'])
+            if not users.exists():
+                raise CommandError(f"ユーザー {options['user']} は存在しません。")
+
+        drifted = 0
+        for user_id, username in users.values_list('pk', 'username').iterator():
+            expected = stats.compute_counters(user_id)
+            actual = stats.stored_counters(user_id)
+            if expected != actual:
+                drifted += 1
+                for key in sorted(set(expected) | set(actual)):
+                    if expected[key] != actual[key]:
+                        kind, bucket = key
+                        self.stdout.write(
+                            f"{username} {kind}:{bucket} stored={actual[key]} actual={expected[key]}"
+                        )
+            if not options['check']:
+                stats.rebuild(user_id)
+
+        if options['check']:
+            if drifted:
+                raise CommandError(f"{drifted} 人のユーザーの集計にずれがあります。")
+            self.stdout.write(self.style.SUCCESS("集計にずれはありません。"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"集計を作り直しました（ずれがあったユーザー: {drifted} 人）。"))
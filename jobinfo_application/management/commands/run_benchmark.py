@@ -0,0 +1,69 @@
+import platform
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from jobinfo_application import benchmark
+
+
+class Command(BaseCommand):
+    help = "主要なビューにリクエストを送り、レイテンシ・クエリ数・最大RSSをベースラインと比較する"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target', choices=[benchmark.TARGET_CLIENT, benchmark.TARGET_GUNICORN], default=benchmark.TARGET_CLIENT,
+            help="client: テストクライアント（プロセス内）、gunicorn: ローカルで起動した gunicorn",
+        )
+        parser.add_argument('--scenario', action='append', choices=benchmark.SCENARIO_NAMES, help="実行するシナリオ（複数指定可）")
+        parser.add_argument('--iterations', type=int, default=50, help="シナリオごとの測定回数")
+        parser.add_argument('--warmup', type=int, default=5, help="測定前に捨てるリクエストの回数")
+        parser.add_argument('--seed', type=int, default=42, help="リクエストの内容を決める乱数の種")
+        parser.add_argument('--workers', type=int, default=1, help="gunicorn のワーカー数")
+        parser.add_argument('--baseline', default=benchmark.BASELINE_PATH, help="ベースラインのファイル")
+        parser.add_argument('--update-baseline', action='store_true', help="結果をベースラインとして保存する")
+        parser.add_argument('--latency-tolerance', type=float, default=0.5, help="p95 の悪化の許容幅（0.5 = 50%%）")
+        parser.add_argument('--rss-tolerance', type=float, default=0.25, help="最大RSSの増加の許容幅")
+
+    def handle(self, *args, **options):
+        try:
+            data = benchmark.load_data()
+        except LookupError as e:
+            raise CommandError(str(e))
+
+        run_options = {
+            'scenarios': options['scenario'],
+            'iterations': options['iterations'],
+            'warmup': options['warmup'],
+            'random_seed': options['seed'],
+        }
+        if options['target'] == benchmark.TARGET_GUNICORN:
+            results = benchmark.run_gunicorn(data, workers=options['workers'], **run_options)
+        else:
+            results = benchmark.run_client(data, **run_options)
+
+        self.stdout.write(f"{'scenario':<22}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>10}{'RSS MB':>10}")
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<22}{result['p50_ms']:>10}{result['p95_ms']:>10}{result['p99_ms']:>10}"
+                f"{str(result['queries']):>10}{str(result['peak_rss_mb']):>10}"
+            )
+
+        if options['update_baseline']:
+            meta = {
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'applications': len(data.application_ids),
+                'iterations': options['iterations'],
+            }
+            benchmark.save_baseline(options['target'], results, path=options['baseline'], meta=meta)
+            self.stdout.write(self.style.SUCCESS(f"ベースラインを保存しました: {options['baseline']}"))
+            return
+
+        baseline = benchmark.load_baseline(options['baseline']).get(options['target'], {}).get('scenarios', {})
+        regressions = benchmark.compare(
+            results, baseline,
+            latency_tolerance=options['latency_tolerance'], rss_tolerance=options['rss_tolerance'],
+        )
+        if regressions:
+            raise CommandError("ベースラインより悪化しました:\n" + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS("ベースラインからの悪化はありません。"))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from jobinfo_application.tasks import requeue_stale_jobs, run_next_jobs
+
+
+class Command(BaseCommand):
+    help = "AIによるES回答ドラフト生成ジョブを処理するワーカー"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="待機中のジョブをすべて処理したら終了する")
+        parser.add_argument('--sleep', type=float, default=2.0, help="ジョブがないときの待機秒数")
+
+    def handle(self, *args, **options):
+        processed = 0
+        while True:
+            close_old_connections()
+            requeue_stale_jobs()
+            jobs = run_next_jobs()
+            if jobs:
+                processed += len(jobs)
+                for job in jobs:
+                    self.stdout.write(f"job {job.pk}: {job.status} (attempt {job.attempts})")
+                continue
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
+        self.stdout.write(self.style.SUCCESS(f"{processed} 件のジョブを処理しました。"))
@@ -0,0 +1,53 @@
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from jobinfo_application.extraction import extract_pending, requeue_stale_extractions, worker_pool
+from jobinfo_application.uploads import purge_expired_uploads
+
+
+class Command(BaseCommand):
+    help = "アップロードされた書類（PDF・DOCX・TXT）から本文を抽出するワーカー"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="抽出待ちの書類をすべて処理したら終了する")
+        parser.add_argument('--sleep', type=float, default=5.0, help="抽出待ちの書類がないときの待機秒数")
+        parser.add_argument('--workers', type=int, help="抽出に使うプロセス数")
+        parser.add_argument('--timeout', type=float, help="1ファイルあたりの制限時間（秒）")
+
+    def handle(self, *args, **options):
+        processed = 0
+        # プロセスの起動（spawn）には時間がかかるため、プールはワーカーが終了するまで使い回す
+        pool = worker_pool(options['workers'])
+        purged_at = None
+        try:
+            while True:
+                close_old_connections()
+                requeue_stale_extractions()
+                # 分割アップロードの一時ファイルはこのワーカーと同じディスクにあるため、期限切れのものをここで削除する
+                if purged_at is None or time.monotonic() - purged_at >= settings.DOCUMENT_UPLOAD_PURGE_INTERVAL:
+                    purged = purge_expired_uploads()
+                    purged_at = time.monotonic()
+                    if purged:
+                        self.stdout.write(f"{purged} 件のアップロードのセッションを削除しました。")
+                try:
+                    counts = extract_pending(pool, max_workers=options['workers'], timeout=options['timeout'])
+                except BrokenProcessPool as e:
+                    # 異常終了したプロセスのあるプールは使えないため作り直す（失敗した書類の結果は保存済み）
+                    self.stderr.write(str(e))
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = worker_pool(options['workers'])
+                    continue
+                if counts:
+                    processed += sum(counts.values())
+                    self.stdout.write(', '.join(f"{status}: {count}" for status, count in sorted(counts.items())))
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+        finally:
+            pool.shutdown()
+        self.stdout.write(self.style.SUCCESS(f"{processed} 件の書類を処理しました。"))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from jobinfo_application import benchmark
+
+
+class Command(BaseCommand):
+    help = "負荷テスト用の合成データ（ユーザー・応募情報・面接ログ・ES設問・職種カテゴリ）を作成する"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=3, help="作成するユーザー数")
+        parser.add_argument('--applications', type=int, default=2000, help="ユーザーあたりの応募情報の件数")
+        parser.add_argument('--logs', type=int, default=2, help="応募情報あたりの面接ログの平均件数")
+        parser.add_argument('--questions', type=int, default=2, help="応募情報あたりのES設問の件数")
+        parser.add_argument('--job-types', type=int, default=60, help="職種カテゴリの種類数")
+        parser.add_argument('--seed', type=int, default=42, help="乱数の種（同じ値なら同じデータになる）")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        counts = benchmark.seed(
+            users=options['users'],
+            applications=options['applications'],
+            logs=options['logs'],
+            questions=options['questions'],
+            job_types=options['job_types'],
+            random_seed=options['seed'],
+            stdout=self.stdout,
+        )
+        summary = ', '.join(f"{name}: {count}" for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"{summary}（{time.monotonic() - started:.1f}秒）"))
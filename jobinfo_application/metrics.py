@@ -0,0 +1,277 @@
+"""
+ビューごとの処理時間・クエリ数の計測（METRICS_ENABLED=True で有効）。
+
+リクエストごとに、URL名（application-detail など）をラベルにして
+全体の処理時間、SQLの件数と時間、テンプレートの描画時間、外部へのHTTP呼び出し（Wikidata・OpenAI）の時間を
+プロセス内のヒストグラムに記録し、/metrics/ でPrometheusのテキスト形式で返す。
+値はワーカープロセスごとに持つため、複数のワーカーで動かす場合は Prometheus 側で合算する。
+"""
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.utils import CursorWrapper
+from django.template.backends.django import Template
+
+logger = logging.getLogger(__name__)
+
+
+# ヒストグラムの区切り（秒）
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# ヒストグラムの区切り（クエリ数）
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+UNMATCHED_VIEW = 'unmatched'
+
+# (メトリクス名, 種類, 説明, 区切り)
+METRICS = {
+    'request_duration': (
+        'jobinfo_request_duration_seconds', 'histogram', 'ビューの処理時間', DURATION_BUCKETS,
+    ),
+    'db_queries': (
+        'jobinfo_db_queries', 'histogram', '1リクエストで実行したSQLの件数', QUERY_COUNT_BUCKETS,
+    ),
+    'db_duration': (
+        'jobinfo_db_duration_seconds', 'histogram', '1リクエストでSQLの実行にかかった時間', DURATION_BUCKETS,
+    ),
+    'template_duration': (
+        'jobinfo_template_render_seconds', 'histogram', '1リクエストでテンプレートの描画にかかった時間', DURATION_BUCKETS,
+    ),
+    'outbound_duration': (
+        'jobinfo_outbound_request_seconds', 'histogram', '外部へのHTTPリクエスト1回の時間', DURATION_BUCKETS,
+    ),
+}
+
+
+class Histogram:
+    """区切りごとの件数と合計だけを持つ、Prometheus形式のヒストグラム"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.counts), self.sum
+
+
+# {(メトリクスのキー, ラベルのタプル): Histogram}
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def observe(key, labels, value):
+    histogram = _histograms.get((key, labels))
+    if histogram is None:
+        with _histograms_lock:
+            histogram = _histograms.setdefault((key, labels), Histogram(METRICS[key][3]))
+    histogram.observe(value)
+
+
+def reset():
+    with _histograms_lock:
+        _histograms.clear()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def render():
+    """記録した値をPrometheusのテキスト形式にする"""
+    with _histograms_lock:
+        items = sorted(_histograms.items(), key=lambda item: item[0])
+    lines = []
+    for key, (name, kind, help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for (metric_key, labels), histogram in items:
+            if metric_key != key:
+                continue
+            counts, total = histogram.snapshot()
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ['+Inf'], counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {total}')
+            lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+class RequestStats:
+    """1リクエストの計測値"""
+
+    __slots__ = ('db_queries', 'db_duration', 'template_duration', 'outbound')
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_duration = 0.0
+        self.template_duration = 0.0
+        # [(ホスト名, 秒)]
+        self.outbound = []
+
+
+# 処理中のリクエストの計測値。sync_to_async で別スレッドに移っても引き継がれる
+_current = contextvars.ContextVar('jobinfo_request_stats', default=None)
+
+
+# 計測のためのフック。どれもリクエストの処理中でなければ何もしない
+
+def _timed_query(execute):
+    def wrapper(self, *args, **kwargs):
+        stats = _current.get()
+        if stats is None:
+            return execute(self, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return execute(self, *args, **kwargs)
+        finally:
+            stats.db_duration += time.perf_counter() - started
+            stats.db_queries += 1
+    return wrapper
+
+
+def _timed_render(render):
+    def wrapper(self, *args, **kwargs):
+        stats = _current.get()
+        if stats is None:
+            return render(self, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            stats.template_duration += time.perf_counter() - started
+    return wrapper
+
+
+def _timed_send(send, host_of):
+    def wrapper(self, request, *args, **kwargs):
+        stats = _current.get()
+        if stats is None:
+            return send(self, request, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return send(self, request, *args, **kwargs)
+        finally:
+            stats.outbound.append((host_of(request), time.perf_counter() - started))
+    return wrapper
+
+
+def _timed_async_send(send, host_of):
+    async def wrapper(self, request, *args, **kwargs):
+        stats = _current.get()
+        if stats is None:
+            return await send(self, request, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return await send(self, request, *args, **kwargs)
+        finally:
+            stats.outbound.append((host_of(request), time.perf_counter() - started))
+    return wrapper
+
+
+_installed = False
+_install_lock = threading.Lock()
+
+
+def install():
+    """SQL・テンプレート・HTTPクライアントにフックを追加する（プロセスごとに1回）"""
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        # 接続はスレッドごとに作られるため、すべての接続で使われるカーソルのクラスに追加する
+        CursorWrapper._execute = _timed_query(CursorWrapper._execute)
+        CursorWrapper._executemany = _timed_query(CursorWrapper._executemany)
+
+        # 最上位のテンプレートだけを計る（{% include %} などは含まれる）
+        Template.render = _timed_render(Template.render)
+
+        # Wikidata（requests）と OpenAI（httpx）
+        requests.Session.send = _timed_send(requests.Session.send, lambda request: urlsplit(request.url).hostname)
+        httpx.Client.send = _timed_send(httpx.Client.send, lambda request: request.url.host)
+        httpx.AsyncClient.send = _timed_async_send(httpx.AsyncClient.send, lambda request: request.url.host)
+        _installed = True
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else UNMATCHED_VIEW
+
+
+def _finish(request, stats, started):
+    duration = time.perf_counter() - started
+    labels = (('view', _view_name(request)),)
+    observe('request_duration', labels, duration)
+    observe('db_queries', labels, stats.db_queries)
+    observe('db_duration', labels, stats.db_duration)
+    observe('template_duration', labels, stats.template_duration)
+    outbound_duration = 0.0
+    for host, seconds in stats.outbound:
+        observe('outbound_duration', labels + (('host', host or ''),), seconds)
+        outbound_duration += seconds
+    if duration >= settings.METRICS_SLOW_REQUEST_SECONDS:
+        logger.warning(
+            'Slow request: %s %s (%s) %.3fs, %d queries in %.3fs, templates %.3fs, outbound %d calls in %.3fs',
+            request.method, request.path, labels[0][1], duration, stats.db_queries, stats.db_duration,
+            stats.template_duration, len(stats.outbound), outbound_duration,
+        )
+
+
+class MetricsMiddleware:
+    """
+    リクエストごとの計測を行うミドルウェア。METRICS_ENABLED=False のときは読み込まれない。
+    ストリーミングのレスポンスは、ビューがレスポンスを返すまでの時間を計る
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        install()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            return self.get_response(request)
+        finally:
+            _current.reset(token)
+            _finish(request, stats, started)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            return await self.get_response(request)
+        finally:
+            _current.reset(token)
+            _finish(request, stats, started)
@@ -0,0 +1,30 @@
+from django.db import migrations
+
+
+# 職種名の部分一致検索 (name__icontains → UPPER(name::text) LIKE UPPER('%...%')) 用のインデックス。
+# pg_trgm はPostgreSQLの拡張機能のため、他のデータベースでは何もしない。
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS jobtype_name_trgm_idx '
+        'ON jobinfo_application_jobtype USING gin ((UPPER(name::text)) gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS jobtype_name_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobinfo_application', '0005_jobapplication_list_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
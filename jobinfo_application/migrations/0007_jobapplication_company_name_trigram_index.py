@@ -0,0 +1,30 @@
+from django.db import migrations
+
+
+# 企業名検索の代替候補 (company_name__icontains) 用のインデックス。
+# pg_trgm はPostgreSQLの拡張機能のため、他のデータベースでは何もしない。
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS jobapp_company_name_trgm_idx '
+        'ON jobinfo_application_jobapplication USING gin ((UPPER(company_name::text)) gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS jobapp_company_name_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobinfo_application', '0006_jobtype_name_trigram_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
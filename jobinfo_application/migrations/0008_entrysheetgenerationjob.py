@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobinfo_application', '0007_jobapplication_company_name_trigram_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntrySheetGenerationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', '待機中'), ('running', '生成中'), ('succeeded', '完了'), ('failed', '失敗')], default='queued', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('max_attempts', models.PositiveIntegerField(default=3)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('entry_sheet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='generation_jobs', to='jobinfo_application.entrysheet')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'run_after'], name='esjob_status_run_after_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='entrysheetgenerationjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running'])), fields=('entry_sheet',), name='esjob_one_active_per_entry_sheet'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobinfo_application', '0009_airesponsecacheentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entrysheetgenerationjob',
+            name='regenerate',
+            field=models.BooleanField(default=False, help_text='キャッシュを使わずにAPIを呼び出す'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobinfo_application', '0010_entrysheetgenerationjob_regenerate'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='interviewlog',
+            index=models.Index(fields=['job_application', 'interview_date'], name='interviewlog_app_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='jobapplication',
+            index=models.Index(condition=models.Q(('next_action_date__isnull', False)), fields=['user', 'next_action_date'], name='jobapp_user_next_action_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:44
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.functions
+import django.db.models.deletion
+
+
+def build_counters(apps, schema_editor):
+    """既存の応募情報と面接ログから、集計の初期値を作る"""
+    JobApplication = apps.get_model('jobinfo_application', 'JobApplication')
+    InterviewLog = apps.get_model('jobinfo_application', 'InterviewLog')
+    DashboardCounter = apps.get_model('jobinfo_application', 'DashboardCounter')
+
+    counters = []
+    status_rows = JobApplication.objects.values('user_id', 'status').annotate(n=models.Count('id')).order_by()
+    for row in status_rows:
+        counters.append(DashboardCounter(user_id=row['user_id'], kind='status', bucket=row['status'], count=row['n']))
+    month_rows = (
+        InterviewLog.objects.annotate(month=models.functions.TruncMonth('interview_date'))
+        .values('job_application__user_id', 'month').annotate(n=models.Count('id')).order_by()
+    )
+    for row in month_rows:
+        counters.append(DashboardCounter(
+            user_id=row['job_application__user_id'], kind='interview_month',
+            bucket=str(row['month'])[:7], count=row['n'],
+        ))
+    DashboardCounter.objects.bulk_create(counters, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('jobinfo_application', '0011_upcoming_event_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DashboardCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('status', '選考ステージ別の応募数'), ('interview_month', '月別の面接数')], max_length=20)),
+                ('bucket', models.CharField(help_text='選考ステージ、または面接の年月 (YYYY-MM)', max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dashboard_counters', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dashboardcounter',
+            constraint=models.UniqueConstraint(fields=('user', 'kind', 'bucket'), name='dashboard_counter_unique_bucket'),
+        ),
+        migrations.RunPython(build_counters, migrations.RunPython.noop),
+    ]
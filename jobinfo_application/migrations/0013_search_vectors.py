@@ -0,0 +1,92 @@
+# Generated by Django 4.2.30 on 2026-10-18 15:48
+
+import re
+import unicodedata
+
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import TextField, Value
+
+
+# このマイグレーションを作成した時点の search.py のトークン分割をそのまま写したもの。
+# search.py を変更しても、このマイグレーションの結果は変わらないようにする
+SEARCH_CONFIG = 'simple'
+_WORD_RE = re.compile(r'[0-9a-z]+|[^\W0-9a-z_]+')
+
+
+def tokenize(text):
+    tokens = []
+    for run in _WORD_RE.findall(unicodedata.normalize('NFKC', text or '').lower()):
+        if run.isascii() or len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def build_document(*texts):
+    return ' '.join(token for text in texts for token in tokenize(text))
+
+
+SEARCH_FIELDS = {
+    'jobapplication': ('company_name', 'job_title', 'job_description', 'notes'),
+    'interviewlog': ('questions_asked', 'self_evaluation', 'stage'),
+    'entrysheet': ('question', 'answer'),
+}
+
+
+def build_search_vectors(apps, schema_editor):
+    postgresql = schema_editor.connection.vendor == 'postgresql'
+    for model_name, fields in SEARCH_FIELDS.items():
+        model = apps.get_model('jobinfo_application', model_name)
+        for row in model.objects.values_list('pk', *fields).iterator():
+            document = build_document(*row[1:])
+            if postgresql:
+                document = SearchVector(Value(document, output_field=TextField()), config=SEARCH_CONFIG)
+            model.objects.filter(pk=row[0]).update(search_vector=document)
+
+
+# tsvector 列のGINインデックス。PostgreSQL以外では何もしない。
+def create_gin_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model_name in SEARCH_FIELDS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {model_name}_search_vector_idx '
+            f'ON jobinfo_application_{model_name} USING gin (search_vector)'
+        )
+
+
+def drop_gin_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for model_name in SEARCH_FIELDS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {model_name}_search_vector_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobinfo_application', '0012_dashboardcounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entrysheet',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='interviewlog',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='jobapplication',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(build_search_vectors, migrations.RunPython.noop),
+        migrations.RunPython(create_gin_indexes, drop_gin_indexes),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:05
+
+from django.db import migrations, models
+import jobinfo_application.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobinfo_application', '0014_documentupload'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='document',
+            name='uploaded_file',
+            field=models.FileField(storage=jobinfo_application.storage.get_document_storage, upload_to='documents/%Y/%m/'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['uploaded_file'], name='document_file_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:13
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+# tsvector 列のGINインデックス。PostgreSQL以外では何もしない。
+# 既存の書類はすべて抽出待ちになり、抽出時に search_vector も保存される
+def create_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS document_search_vector_idx '
+        'ON jobinfo_application_document USING gin (search_vector)'
+    )
+
+
+def drop_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS document_search_vector_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobinfo_application', '0015_document_content_addressed_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='extracted_sha256',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='extracted_text',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='extraction_started_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='extraction_status',
+            field=models.CharField(choices=[('pending', '抽出待ち'), ('running', '抽出中'), ('done', '抽出済み'), ('unsupported', '対象外'), ('failed', '失敗')], default='pending', editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(condition=models.Q(('extraction_status', 'pending')), fields=['id'], name='document_extract_pending_idx'),
+        ),
+        migrations.RunPython(create_gin_index, drop_gin_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobinfo_application', '0018_userprofile_data_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentupload',
+            name='sha256_state',
+            field=models.BinaryField(blank=True, default=b''),
+        ),
+    ]
@@ -1,6 +1,39 @@
-from django.db import models
+import os
+import time
+import uuid
+
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
 from django.urls import reverse
+from django.utils import timezone
+
+from .storage import get_document_storage
+
+
+class UserProfileManager(models.Manager):
+    """プロフィールのマネージャー"""
+
+    def for_user(self, user):
+        """
+        ユーザーのプロフィールを返す。まだなければその場で作成する（同時に作成しても1件になる）。
+        ユーザー登録やログインのたびに書き込まないよう、プロフィールは必要になったときに作る
+        """
+        try:
+            return user.profile
+        except self.model.DoesNotExist:
+            pass
+        # ないことは確認済みなので、get_or_create のように問い合わせ直さずに作成する
+        try:
+            with transaction.atomic():
+                profile = self.create(user=user)
+        except IntegrityError:
+            # 同時に作成された場合は、作成済みの行を使う
+            profile = self.get(user=user)
+        # 以降の user.profile で問い合わせないようにする
+        user.profile = profile
+        return profile
 
 
 class UserProfile(models.Model):
@@ -21,17 +54,87 @@ class UserProfile(models.Model):
         help_text="あなたの強みや、仕事に対する価値観を記入してください。"
     )
     updated_at = models.DateTimeField(auto_now=True)
+    # 応募情報・面接ログ・ES設問・書類を保存・削除するたびに上げるバージョン（fragments.py）。
+    # データベースを作り直しても共有キャッシュに残った古い値と重ならないよう、時刻から始める
+    data_version = models.PositiveBigIntegerField(default=time.time_ns, editable=False)
+
+    objects = UserProfileManager()
 
     def __str__(self):
         return f"{self.user.username}'s Profile"
 
 
+class JobTypeManager(models.Manager):
+    """職種カテゴリのマネージャー"""
+
+    def resolve_names(self, names):
+        """
+        職種名のリストを {名前: id} に解決する。存在しない職種はまとめて作成する。
+        件数に関わらずクエリ数は最大3回で、同じ職種を同時に作成しても
+        一意制約の衝突は無視され、もう一方が作成した行を読み直す。
+        """
+        names = set(names)
+        if not names:
+            return {}
+        resolved = dict(self.filter(name__in=names).values_list('name', 'id'))
+        missing = names - resolved.keys()
+        if missing:
+            self.bulk_create([self.model(name=name) for name in missing], ignore_conflicts=True)
+            resolved.update(self.filter(name__in=missing).values_list('name', 'id'))
+        return resolved
+
+    def autocomplete(self, term, limit=10):
+        """
+        入力途中の文字列に一致する職種名を返す。
+        前方一致を優先し、次に応募情報での使用回数が多い順に並べる。
+        PostgreSQLではpg_trgmのGINインデックスが部分一致検索に使われる。
+        """
+        return (
+            self.filter(name__icontains=term)
+            .annotate(
+                prefix_rank=models.Case(
+                    models.When(name__istartswith=term, then=models.Value(0)),
+                    default=models.Value(1),
+                ),
+                usage_count=models.Count('jobapplication'),
+            )
+            .order_by('prefix_rank', '-usage_count', 'name')
+            .values_list('name', flat=True)[:limit]
+        )
+
+
 class JobType(models.Model):
     """職種モデル"""
     name = models.CharField(max_length=100, unique=True)
+
+    objects = JobTypeManager()
+
     def __str__(self):
         return self.name
     
+class JobApplicationQuerySet(models.QuerySet):
+    """応募情報のクエリセット"""
+
+    # 一覧表示に必要な列。企業情報の貼り付け用TextFieldは含めない
+    SUMMARY_FIELDS = (
+        'id', 'user_id', 'company_name', 'job_title', 'status',
+        'next_action', 'next_action_date', 'applied_at',
+    )
+
+    def summary(self):
+        """一覧用に、大きなTextFieldを読み込まない軽量な射影を返す"""
+        return self.only(*self.SUMMARY_FIELDS)
+
+    def for_detail_page(self):
+        """
+        詳細ページ用。書類・面接ログ・ES設問は先読みせず、ページの断片がキャッシュにないときだけ
+        JobApplication.detail_sections() で読み込む。ES設問の有無だけは応募情報と一緒に問い合わせる
+        """
+        return self.defer('search_vector').annotate(
+            has_entry_sheets=models.Exists(EntrySheet.objects.filter(job_application=models.OuterRef('pk')))
+        )
+
+
 class JobApplication(models.Model):
     STATUS_CHOICES = [('検討中', '応募検討中'), ('応募済', '書類応募済'), ('選考中', '選考中'), ('内定', '内定'), ('見送り', '見送り')]
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -79,7 +182,23 @@ class JobApplication(models.Model):
 
     notes = models.TextField(blank=True, null=True, verbose_name="その他")
     applied_at = models.DateTimeField(auto_now_add=True, verbose_name="登録日")
+    # 全文検索用のトークン列（search.py を参照）
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    SEARCH_FIELDS = ('company_name', 'job_title', 'job_description', 'notes')
+
+    objects = JobApplicationQuerySet.as_manager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-applied_at', '-id'], name='jobapp_user_applied_idx'),
+            models.Index(fields=['user', 'status'], name='jobapp_user_status_idx'),
+            models.Index(
+                fields=['user', 'next_action_date'],
+                condition=models.Q(next_action_date__isnull=False),
+                name='jobapp_user_next_action_idx',
+            ),
+        ]
 
     def __str__(self): 
         return f"{self.company_name} - {self.job_title}"
@@ -87,6 +206,14 @@ class JobApplication(models.Model):
     def get_absolute_url(self): 
         return reverse('application-detail', kwargs={'pk': self.pk})
 
+    def detail_sections(self):
+        """詳細ページに表示する書類・面接ログ・ES設問のクエリセット（表示しない大きな列は読み込まない）"""
+        return {
+            'documents': self.documents.defer('extracted_text', 'search_vector'),
+            'interview_logs': self.interview_logs.defer('search_vector'),
+            'entry_sheets': self.entry_sheets.only('id', 'job_application_id', 'question'),
+        }
+
 
 class InterviewLog(models.Model):
     """面接の記録を管理するモデル"""
@@ -97,8 +224,14 @@ class InterviewLog(models.Model):
     self_evaluation = models.TextField(blank=True, verbose_name="自己評価・感想")
     next_steps = models.TextField(blank=True, verbose_name="次のステップ・連絡事項")
     created_at = models.DateTimeField(auto_now_add=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    SEARCH_FIELDS = ('questions_asked', 'self_evaluation', 'stage')
     class Meta:
         ordering = ['-interview_date']
+        indexes = [
+            models.Index(fields=['job_application', 'interview_date'], name='interviewlog_app_date_idx'),
+        ]
     def __str__(self): return f"{self.job_application.company_name} - {self.stage}"
 
 
@@ -109,13 +242,191 @@ class EntrySheet(models.Model):
     answer = models.TextField(blank=True, verbose_name="回答")
     ai_draft = models.TextField(blank=True, verbose_name="AIによるドラフト")
     updated_at = models.DateTimeField(auto_now=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    SEARCH_FIELDS = ('question', 'answer')
     def __str__(self): return f"{self.job_application.company_name} - {self.question[:30]}..."
 
 
 class Document(models.Model):
     job_application = models.ForeignKey(JobApplication, related_name='documents', on_delete=models.CASCADE)
     name = models.CharField(max_length=255, verbose_name="書類名")
-    uploaded_file = models.FileField(upload_to='documents/%Y/%m/')
+    # 同じ内容のファイルは1つだけ保存し、複数の書類で共有する（storage.py を参照）
+    uploaded_file = models.FileField(upload_to='documents/%Y/%m/', storage=get_document_storage)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    sha256 = models.CharField(max_length=64, blank=True, editable=False)
+    size = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
+
+    # ファイルから抽出した本文（manage.py run_extraction_worker がバックグラウンドで抽出する。extraction.py を参照）
+    EXTRACTION_PENDING = 'pending'
+    EXTRACTION_RUNNING = 'running'
+    EXTRACTION_DONE = 'done'
+    EXTRACTION_UNSUPPORTED = 'unsupported'
+    EXTRACTION_FAILED = 'failed'
+    EXTRACTION_STATUS_CHOICES = [
+        (EXTRACTION_PENDING, '抽出待ち'),
+        (EXTRACTION_RUNNING, '抽出中'),
+        (EXTRACTION_DONE, '抽出済み'),
+        (EXTRACTION_UNSUPPORTED, '対象外'),
+        (EXTRACTION_FAILED, '失敗'),
+    ]
+    extraction_status = models.CharField(
+        max_length=20, choices=EXTRACTION_STATUS_CHOICES, default=EXTRACTION_PENDING, editable=False
+    )
+    extracted_text = models.TextField(blank=True, editable=False)
+    # 本文を抽出したときのファイルのSHA-256。ファイルが変わっていなければ抽出し直さない
+    extracted_sha256 = models.CharField(max_length=64, blank=True, editable=False)
+    extraction_started_at = models.DateTimeField(null=True, blank=True, editable=False)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    SEARCH_FIELDS = ('name', 'extracted_text')
+
+    class Meta:
+        indexes = [
+            # ファイルを参照している書類の数を数えるためのインデックス
+            models.Index(fields=['uploaded_file'], name='document_file_idx'),
+            # 抽出待ちの書類だけを探すためのインデックス
+            models.Index(
+                fields=['id'], name='document_extract_pending_idx',
+                condition=models.Q(extraction_status='pending'),
+            ),
+        ]
+
     def __str__(self): 
-        return self.name
\ No newline at end of file
+        return self.name
+
+
+class DocumentBlob(models.Model):
+    """
+    書類のファイル（storage.py）ごとのロック用の行。
+    同じ内容のファイルを使い回す保存と、参照がなくなったファイルの削除（signals.py）が重ならないよう、
+    どちらもこの行をロックしてから行う
+    """
+    name = models.CharField(max_length=100, unique=True)
+
+    def __str__(self):
+        return self.name
+
+class EntrySheetGenerationJob(models.Model):
+    """AIによるES回答ドラフト生成のジョブ（ワーカーが同じ応募情報のジョブをまとめて処理する）"""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, '待機中'),
+        (STATUS_RUNNING, '生成中'),
+        (STATUS_SUCCEEDED, '完了'),
+        (STATUS_FAILED, '失敗'),
+    ]
+    ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_RUNNING)
+
+    entry_sheet = models.ForeignKey(EntrySheet, on_delete=models.CASCADE, related_name='generation_jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    regenerate = models.BooleanField(default=False, help_text="キャッシュを使わずにAPIを呼び出す")
+    run_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='esjob_status_run_after_idx'),
+        ]
+        constraints = [
+            # 同じ設問に対して、待機中・生成中のジョブは1つまで
+            models.UniqueConstraint(
+                fields=['entry_sheet'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='esjob_one_active_per_entry_sheet',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.entry_sheet} ({self.get_status_display()})"
+
+    @property
+    def is_active(self):
+        return self.status in self.ACTIVE_STATUSES
+
+
+class AIResponseCacheEntry(models.Model):
+    """プロンプトとパラメータのハッシュをキーにした、AIの応答キャッシュ"""
+    key = models.CharField(max_length=64, unique=True)
+    model = models.CharField(max_length=100)
+    response = models.TextField()
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    completion_tokens = models.PositiveIntegerField(default=0)
+    latency_ms = models.PositiveIntegerField(default=0, help_text="生成にかかった時間（キャッシュ利用時に短縮できた時間）")
+    hits = models.PositiveIntegerField(default=0)
+    misses = models.PositiveIntegerField(default=1, help_text="このキーでAPIを呼び出した回数（再生成を含む）")
+    created_at = models.DateTimeField(default=timezone.now)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.model} {self.key[:12]}"
+
+
+class DashboardCounter(models.Model):
+    """
+    ダッシュボード用にユーザーごとに集計済みの件数。
+    シグナルで増減させ、rebuild_dashboard_stats コマンドで作り直せる
+    """
+    KIND_STATUS = 'status'
+    KIND_INTERVIEW_MONTH = 'interview_month'
+    KIND_CHOICES = [
+        (KIND_STATUS, '選考ステージ別の応募数'),
+        (KIND_INTERVIEW_MONTH, '月別の面接数'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='dashboard_counters')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    bucket = models.CharField(max_length=20, help_text="選考ステージ、または面接の年月 (YYYY-MM)")
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'kind', 'bucket'], name='dashboard_counter_unique_bucket'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} {self.kind}:{self.bucket}={self.count}"
+
+
+class DocumentUpload(models.Model):
+    """
+    書類の分割アップロードのセッション。
+    受信済みのデータは一時ファイルに追記し、すべて揃ったら Document を作成する
+    """
+    STATUS_UPLOADING = 'uploading'
+    STATUS_COMPLETED = 'completed'
+    STATUS_CHOICES = [
+        (STATUS_UPLOADING, 'アップロード中'),
+        (STATUS_COMPLETED, '完了'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='document_uploads')
+    job_application = models.ForeignKey(JobApplication, on_delete=models.CASCADE, related_name='document_uploads')
+    name = models.CharField(max_length=255)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField(help_text="ファイル全体のバイト数")
+    offset = models.PositiveBigIntegerField(default=0, help_text="受信済みのバイト数")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_UPLOADING)
+    sha256 = models.CharField(max_length=64, blank=True)
+    # 受信済みのデータのSHA-256の途中の状態（sha256_state.py）。空なら完了時にファイル全体から計算する
+    sha256_state = models.BinaryField(blank=True, default=b'', editable=False)
+    document = models.ForeignKey(Document, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
+
+    @property
+    def temp_path(self):
+        return os.path.join(settings.DOCUMENT_UPLOAD_TEMP_DIR, f"{self.pk}.part")
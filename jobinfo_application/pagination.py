@@ -0,0 +1,49 @@
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+def encode_cursor(application):
+    """(applied_at, id) をURLに載せられるカーソル文字列に変換"""
+    raw = f"{application.applied_at.isoformat()}|{application.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """カーソル文字列を (applied_at, id) に戻す。不正な値の場合は None"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        applied_at_str, pk_str = raw.rsplit('|', 1)
+        applied_at = parse_datetime(applied_at_str)
+        pk = int(pk_str)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if applied_at is None:
+        return None
+    return applied_at, pk
+
+
+def paginate_by_cursor(queryset, cursor, page_size):
+    """
+    (applied_at, id) の降順でキーセットページネーションを行う。
+    OFFSETを使わないため、何ページ目でもインデックスを先頭から辿るだけで済む。
+    戻り値は (そのページの行リスト, 次ページのカーソル or None)
+    """
+    queryset = queryset.order_by('-applied_at', '-id')
+    position = decode_cursor(cursor)
+    if position is not None:
+        applied_at, pk = position
+        queryset = queryset.filter(
+            Q(applied_at__lt=applied_at) | Q(applied_at=applied_at, id__lt=pk)
+        )
+    rows = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1])
+    return rows, next_cursor
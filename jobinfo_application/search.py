@@ -0,0 +1,186 @@
+"""
+応募情報・面接ログ・ES設問・書類（抽出した本文）の全文検索。
+
+日本語は単語の区切りに空白を使わないため、PostgreSQLの辞書ではうまく分かち書きできない。
+そこで保存時に本文を自前でトークン（英数字は単語、それ以外は2文字ずつのbi-gram）に分割し、
+PostgreSQLでは 'simple' 設定の tsvector としてGINインデックスつきの列に保存する。
+SQLite（テスト用）では同じトークン列を空白区切りの文字列として保存し、正規表現で検索する。
+
+どちらのデータベースでも、検索語のトークンすべてに完全一致する行を返す（前方一致はしない）。
+そのため英単語の途中まで（"pyth" で "python"）や、日本語の1文字だけの検索語（"面" で "面接"）には一致しない。
+"""
+import re
+import unicodedata
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, TextField, Value
+from django.urls import reverse
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Document, EntrySheet, InterviewLog, JobApplication
+
+
+SEARCH_CONFIG = 'simple'
+_WORD_RE = re.compile(r'[0-9a-z]+|[^\W0-9a-z_]+')
+
+
+def normalize(text):
+    return unicodedata.normalize('NFKC', text or '').lower()
+
+
+def tokenize(text):
+    """英数字はそのまま1語、日本語などは2文字ずつのbi-gramに分割する"""
+    tokens = []
+    for run in _WORD_RE.findall(normalize(text)):
+        if run.isascii() or len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def build_document(*texts):
+    """検索用に保存するトークン列（空白区切り）"""
+    return ' '.join(token for text in texts for token in tokenize(text))
+
+
+def _uses_tsvector():
+    return connection.vendor == 'postgresql'
+
+
+def document_value(instance):
+    """search_vector 列に保存する値（PostgreSQLでは tsvector に変換する式）"""
+    document = build_document(*(getattr(instance, name) for name in instance.SEARCH_FIELDS))
+    if _uses_tsvector():
+        return SearchVector(Value(document, output_field=TextField()), config=SEARCH_CONFIG)
+    return document
+
+
+def update_search_vector(instance):
+    """保存されたインスタンスの検索用の列を更新する"""
+    type(instance).objects.filter(pk=instance.pk).update(search_vector=document_value(instance))
+
+
+def tsquery(tokens):
+    """PostgreSQLの to_tsquery に渡す式。トークンはどれも完全一致で、すべてを含む行に一致する"""
+    # トークンは英数字・文字だけからなるため、tsqueryの記号（' & : など）は含まない
+    return ' & '.join(f"'{token}'" for token in tokens)
+
+
+def filter_tokens(queryset, tokens):
+    """検索語のトークンすべてを含む行に絞り込む（PostgreSQLとSQLiteで同じ結果になる）"""
+    if _uses_tsvector():
+        return queryset.filter(search_vector=SearchQuery(tsquery(tokens), config=SEARCH_CONFIG, search_type='raw'))
+    for token in tokens:
+        # 部分文字列ではなく、空白で区切られたトークンとして一致させる
+        queryset = queryset.filter(search_vector__regex=rf'(^| ){re.escape(token)}( |$)')
+    return queryset
+
+
+def _search_model(queryset, tokens, limit):
+    queryset = filter_tokens(queryset, tokens)
+    if _uses_tsvector():
+        query = SearchQuery(tsquery(tokens), config=SEARCH_CONFIG, search_type='raw')
+        return list(
+            queryset.annotate(rank=SearchRank(F('search_vector'), query))
+            .defer('search_vector')
+            .order_by('-rank')[:limit]
+        )
+
+    rows = list(queryset)
+    for row in rows:
+        # 一致したトークンの出現回数を簡易的な順位にする
+        document = row.search_vector.split()
+        row.rank = sum(document.count(token) for token in tokens) / (len(document) or 1)
+    rows.sort(key=lambda row: row.rank, reverse=True)
+    return rows[:limit]
+
+
+def highlight(text, query, width=40):
+    """本文中で検索語に一致した部分の前後を切り出し、<mark> で強調したHTMLを返す"""
+    text = unicodedata.normalize('NFKC', text or '')
+    lowered = text.lower()
+    needles = [normalize(query).strip()] + sorted(set(normalize(query).split()), key=len, reverse=True)
+    for needle in needles:
+        start = lowered.find(needle) if needle else -1
+        if start >= 0:
+            break
+    else:
+        return None
+    end = start + len(needle)
+    left = max(0, start - width)
+    right = min(len(text), end + width)
+    snippet = (
+        ('…' if left > 0 else '')
+        + escape(text[left:start])
+        + '<mark>' + escape(text[start:end]) + '</mark>'
+        + escape(text[end:right])
+        + ('…' if right < len(text) else '')
+    )
+    return mark_safe(snippet)
+
+
+def _snippet(instance, query):
+    for name in instance.SEARCH_FIELDS:
+        snippet = highlight(getattr(instance, name), query)
+        if snippet:
+            return snippet
+    return escape(getattr(instance, instance.SEARCH_FIELDS[0]) or '')[:80]
+
+
+def full_text_search(user, query, limit=20):
+    """
+    ユーザー自身の応募情報・面接ログ・ES設問・書類を全文検索し、
+    関連度の高い順に {kind, title, snippet, url, rank} のリストを返す
+    """
+    tokens = list(dict.fromkeys(tokenize(query)))
+    if not tokens:
+        return []
+
+    applications = _search_model(JobApplication.objects.filter(user=user), tokens, limit)
+    logs = _search_model(
+        InterviewLog.objects.filter(job_application__user=user).select_related('job_application'), tokens, limit
+    )
+    entry_sheets = _search_model(
+        EntrySheet.objects.filter(job_application__user=user).select_related('job_application'), tokens, limit
+    )
+
+    documents = _search_model(Document.objects.filter(job_application__user=user), tokens, limit)
+
+    results = []
+    for application in applications:
+        results.append({
+            'kind': '応募情報',
+            'title': str(application),
+            'snippet': _snippet(application, query),
+            'url': application.get_absolute_url(),
+            'rank': application.rank,
+        })
+    for log in logs:
+        results.append({
+            'kind': '面接ログ',
+            'title': str(log),
+            'snippet': _snippet(log, query),
+            'url': reverse('application-detail', kwargs={'pk': log.job_application_id}),
+            'rank': log.rank,
+        })
+    for entry_sheet in entry_sheets:
+        results.append({
+            'kind': 'ES設問',
+            'title': str(entry_sheet),
+            'snippet': _snippet(entry_sheet, query),
+            'url': reverse('es-detail', kwargs={'pk': entry_sheet.pk}),
+            'rank': entry_sheet.rank,
+        })
+    for document in documents:
+        results.append({
+            'kind': '書類',
+            'title': str(document),
+            'snippet': _snippet(document, query),
+            'url': reverse('application-detail', kwargs={'pk': document.job_application_id}),
+            'rank': document.rank,
+        })
+    results.sort(key=lambda result: result['rank'], reverse=True)
+    return results[:limit]
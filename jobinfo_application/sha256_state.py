@@ -0,0 +1,74 @@
+"""
+途中の状態を保存して、別のリクエストやプロセスで続きから計算できる SHA-256（分割アップロードで使う）。
+
+hashlib のオブジェクトは状態を取り出せないため、OpenSSL（libcrypto）の SHA256_CTX をそのまま bytes として保存する。
+libcrypto を読み込めない環境では available() が偽になり、呼び出し元はファイル全体から計算する。
+"""
+import ctypes
+import ctypes.util
+import hashlib
+import io
+
+# SHA256_CTX は 112 バイト。OpenSSL の版によって大きさが変わっても壊れないよう、余裕をもって確保する
+STATE_SIZE = 256
+BLOCK_SIZE = 64 * 1024
+
+
+def _load_libcrypto():
+    name = ctypes.util.find_library('crypto')
+    if not name:
+        return None
+    try:
+        lib = ctypes.CDLL(name)
+        lib.SHA256_Init.argtypes = [ctypes.c_void_p]
+        lib.SHA256_Update.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_size_t]
+        lib.SHA256_Final.argtypes = [ctypes.c_char_p, ctypes.c_void_p]
+    except (OSError, AttributeError):
+        return None
+    return lib
+
+
+_libcrypto = _load_libcrypto()
+
+
+def _context(state):
+    return ctypes.create_string_buffer(bytes(state), STATE_SIZE)
+
+
+def new():
+    """何も読み込んでいない状態"""
+    context = ctypes.create_string_buffer(STATE_SIZE)
+    _libcrypto.SHA256_Init(context)
+    return context.raw
+
+
+def update(state, file):
+    """file の残りをすべて読み込んだ後の状態を返す"""
+    context = _context(state)
+    while True:
+        block = file.read(BLOCK_SIZE)
+        if not block:
+            return context.raw
+        _libcrypto.SHA256_Update(context, block, len(block))
+
+
+def hexdigest(state):
+    digest = ctypes.create_string_buffer(32)
+    _libcrypto.SHA256_Final(digest, _context(state))
+    return digest.raw.hex()
+
+
+def _works():
+    # 読み込んだライブラリが hashlib と同じ結果になる場合だけ使う
+    try:
+        state = update(new(), io.BytesIO(b'abc'))
+        return hexdigest(update(state, io.BytesIO(b'def'))) == hashlib.sha256(b'abcdef').hexdigest()
+    except (AttributeError, ctypes.ArgumentError):
+        return False
+
+
+_available = _libcrypto is not None and _works()
+
+
+def available():
+    return _available
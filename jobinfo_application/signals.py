@@ -1,13 +1,147 @@
-from django.db.models.signals import post_save
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-from .models import UserProfile
+from .models import JobApplication, InterviewLog, EntrySheet, Document, DocumentBlob
+from .fragments import bump_fragment_version
+from .search import update_search_vector
+from .storage import lock_blob
+from . import stats
 
-@receiver(post_save, sender=User)
-def create_user_profile(sender, instance, created, **kwargs):
+# プロフィールはユーザーの保存時（ログイン時の last_login の更新を含む）には作らず、
+# 必要になったときに UserProfile.objects.for_user() で作る
+
+
+def _application_user_id(instance):
+    """面接ログ・ES設問・書類の持ち主のユーザーID（1つのシグナル処理の中で何度も問い合わせないよう記録する）"""
+    if not hasattr(instance, '_owner_id'):
+        if type(instance).job_application.is_cached(instance):
+            instance._owner_id = instance.job_application.user_id
+        else:
+            instance._owner_id = (
+                JobApplication.objects.filter(pk=instance.job_application_id).values_list('user_id', flat=True).first()
+            )
+    return instance._owner_id
+
+
+# 一覧・詳細ページの断片キャッシュと今後の予定のキャッシュ（fragments.py）
+
+def _deleted_with_application(origin):
+    """応募情報（またはそれを持つユーザー）の削除に伴って削除されたか"""
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model in (JobApplication, User)
+
+
+@receiver(post_save, sender=JobApplication)
+@receiver(post_delete, sender=JobApplication)
+def expire_fragments_for_application(sender, instance, **kwargs):
+    bump_fragment_version(instance.user_id)
+
+
+@receiver(post_save, sender=InterviewLog)
+@receiver(post_save, sender=EntrySheet)
+@receiver(post_save, sender=Document)
+@receiver(post_delete, sender=InterviewLog)
+@receiver(post_delete, sender=EntrySheet)
+@receiver(post_delete, sender=Document)
+def expire_fragments_for_related(sender, instance, origin=None, **kwargs):
+    # 応募情報の削除に伴う削除では、応募情報のシグナルで上げる
+    if origin is not None and _deleted_with_application(origin):
+        return
+    user_id = _application_user_id(instance)
+    if user_id is not None:
+        bump_fragment_version(user_id)
+
+
+# ダッシュボードの集計
+
+def _previous_value(sender, instance, field_name, update_fields):
+    if instance._state.adding or (update_fields is not None and field_name not in update_fields):
+        return None
+    return sender.objects.filter(pk=instance.pk).values_list(field_name, flat=True).first()
+
+
+@receiver(pre_save, sender=JobApplication)
+def remember_previous_status(sender, instance, update_fields=None, **kwargs):
+    instance._previous_status = _previous_value(sender, instance, 'status', update_fields)
+
+
+@receiver(post_save, sender=JobApplication)
+def count_application_status(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_status', None)
     if created:
-        UserProfile.objects.create(user=instance)
+        stats.bump(instance.user_id, stats.STATUS, instance.status, 1)
+    elif previous is not None and previous != instance.status:
+        stats.bump(instance.user_id, stats.STATUS, previous, -1)
+        stats.bump(instance.user_id, stats.STATUS, instance.status, 1)
+
+
+@receiver(post_delete, sender=JobApplication)
+def uncount_application_status(sender, instance, **kwargs):
+    stats.bump(instance.user_id, stats.STATUS, instance.status, -1)
+
+
+@receiver(pre_save, sender=InterviewLog)
+def remember_previous_interview_date(sender, instance, update_fields=None, **kwargs):
+    instance._previous_interview_date = _previous_value(sender, instance, 'interview_date', update_fields)
+
+
+@receiver(post_save, sender=InterviewLog)
+def count_interview_month(sender, instance, created, **kwargs):
+    user_id = _application_user_id(instance)
+    if user_id is None:
+        return
+    previous = getattr(instance, '_previous_interview_date', None)
+    if created:
+        stats.bump(user_id, stats.INTERVIEW_MONTH, stats.month_bucket(instance.interview_date), 1)
+    elif previous is not None and stats.month_bucket(previous) != stats.month_bucket(instance.interview_date):
+        stats.bump(user_id, stats.INTERVIEW_MONTH, stats.month_bucket(previous), -1)
+        stats.bump(user_id, stats.INTERVIEW_MONTH, stats.month_bucket(instance.interview_date), 1)
+
+
+@receiver(post_delete, sender=InterviewLog)
+def uncount_interview_month(sender, instance, **kwargs):
+    user_id = _application_user_id(instance)
+    if user_id is not None:
+        stats.bump(user_id, stats.INTERVIEW_MONTH, stats.month_bucket(instance.interview_date), -1)
+
+
+# 全文検索用の列
+
+@receiver(post_save, sender=JobApplication)
+@receiver(post_save, sender=InterviewLog)
+@receiver(post_save, sender=EntrySheet)
+@receiver(post_save, sender=Document)
+def refresh_search_vector(sender, instance, created, update_fields=None, **kwargs):
+    # 検索対象の列を更新しない保存（AIドラフトの保存など）では作り直さない
+    if created or update_fields is None or set(update_fields) & set(sender.SEARCH_FIELDS):
+        update_search_vector(instance)
+
+
+# 書類の本文の抽出（extraction.py）
+
+@receiver(pre_save, sender=Document)
+def queue_text_extraction(sender, instance, **kwargs):
+    # ファイルが前回の抽出時から変わっていなければ、抽出し直さない
+    if not instance.sha256 or instance.sha256 != instance.extracted_sha256:
+        instance.extraction_status = Document.EXTRACTION_PENDING
+
+
+# 書類のファイル（同じ内容のファイルは複数の書類で共有している）
+
+def _delete_file_if_unreferenced(storage, name):
+    with transaction.atomic():
+        # 同じファイルを使い回す保存（storage.py）が確定するのを待ってから数える
+        lock_blob(name)
+        if not Document.objects.filter(uploaded_file=name).exists():
+            storage.delete(name)
+            DocumentBlob.objects.filter(name=name).delete()
+
 
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    instance.profile.save()
\ No newline at end of file
+@receiver(post_delete, sender=Document)
+def delete_unreferenced_document_file(sender, instance, **kwargs):
+    # 他の書類が参照しているかどうかは、削除が確定してから数える
+    if instance.uploaded_file:
+        storage, name = instance.uploaded_file.storage, instance.uploaded_file.name
+        transaction.on_commit(lambda: _delete_file_if_unreferenced(storage, name))
@@ -0,0 +1,100 @@
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncMonth
+
+from .models import DashboardCounter, InterviewLog, JobApplication
+
+
+STATUS = DashboardCounter.KIND_STATUS
+INTERVIEW_MONTH = DashboardCounter.KIND_INTERVIEW_MONTH
+
+# 各選考ステージに「到達した」とみなす応募情報のステータス
+FUNNEL_STAGES = [
+    ('registered', [status for status, _ in JobApplication.STATUS_CHOICES]),
+    ('applied', ['応募済', '選考中', '内定', '見送り']),
+    ('interviewing', ['選考中', '内定']),
+    ('offered', ['内定']),
+]
+
+
+def month_bucket(date):
+    """日付（または 'YYYY-MM-DD' 形式の文字列）を 'YYYY-MM' にする"""
+    return str(date)[:7]
+
+
+def bump(user_id, kind, bucket, delta):
+    """集計済みの件数を増減する（行がなければ作る）"""
+    counters = DashboardCounter.objects.filter(user_id=user_id, kind=kind, bucket=bucket)
+    if counters.update(count=F('count') + delta) or delta < 0:
+        # 行がないのに減らす場合（ユーザー削除に伴う連鎖削除など）は何もしない
+        return
+    try:
+        with transaction.atomic():
+            DashboardCounter.objects.create(user_id=user_id, kind=kind, bucket=bucket, count=delta)
+    except IntegrityError:
+        # 同時に作成された場合は、作成済みの行を更新する
+        counters.update(count=F('count') + delta)
+
+
+def compute_counters(user_id):
+    """応募情報と面接ログから、集計をゼロから計算する"""
+    counters = Counter()
+    status_rows = (
+        JobApplication.objects.filter(user_id=user_id)
+        .values('status').annotate(n=Count('id')).order_by()
+    )
+    for row in status_rows:
+        counters[(STATUS, row['status'])] = row['n']
+    month_rows = (
+        InterviewLog.objects.filter(job_application__user_id=user_id)
+        .annotate(month=TruncMonth('interview_date'))
+        .values('month').annotate(n=Count('id')).order_by()
+    )
+    for row in month_rows:
+        counters[(INTERVIEW_MONTH, month_bucket(row['month']))] = row['n']
+    return counters
+
+
+def stored_counters(user_id):
+    """保存されている集計（件数0の行は除く）"""
+    rows = DashboardCounter.objects.filter(user_id=user_id).exclude(count=0)
+    return Counter({(row.kind, row.bucket): row.count for row in rows})
+
+
+def rebuild(user_id):
+    """ユーザーの集計を作り直す"""
+    counters = compute_counters(user_id)
+    with transaction.atomic():
+        DashboardCounter.objects.filter(user_id=user_id).delete()
+        DashboardCounter.objects.bulk_create([
+            DashboardCounter(user_id=user_id, kind=kind, bucket=bucket, count=count)
+            for (kind, bucket), count in counters.items()
+        ])
+    return counters
+
+
+def get_dashboard_stats(user_id):
+    """選考ステージ別の件数、ファネルの通過率、月別の面接数を返す（クエリは1回）"""
+    status_counts = {status: 0 for status, _ in JobApplication.STATUS_CHOICES}
+    interviews_per_month = {}
+    for kind, bucket, count in DashboardCounter.objects.filter(user_id=user_id).values_list('kind', 'bucket', 'count'):
+        if kind == STATUS:
+            status_counts[bucket] = count
+        elif count:
+            interviews_per_month[bucket] = count
+
+    funnel = {name: sum(status_counts.get(s, 0) for s in statuses) for name, statuses in FUNNEL_STAGES}
+    conversion_rates = {}
+    for (previous, _), (current, _) in zip(FUNNEL_STAGES, FUNNEL_STAGES[1:]):
+        conversion_rates[f'{previous}_to_{current}'] = (
+            round(funnel[current] / funnel[previous], 4) if funnel[previous] else 0.0
+        )
+    return {
+        'total': funnel['registered'],
+        'status_counts': status_counts,
+        'funnel': funnel,
+        'conversion_rates': conversion_rates,
+        'interviews_per_month': dict(sorted(interviews_per_month.items())),
+    }
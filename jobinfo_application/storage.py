@@ -0,0 +1,73 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+
+
+BLOB_PREFIX = 'blobs'
+
+
+def blob_name(sha256, extension=''):
+    """SHA-256 から保存先のファイル名を決める（1つのディレクトリにファイルが集中しないよう2段に分ける）"""
+    return f"{BLOB_PREFIX}/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension.lower()}"
+
+
+def content_sha256(content):
+    """
+    ファイルのSHA-256。アップロード時に計算済みなら content.sha256 をそのまま使い、
+    なければ少しずつ読みながら計算する
+    """
+    sha256 = getattr(content, 'sha256', None)
+    if sha256:
+        return sha256
+    hasher = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    content.seek(0)
+    return hasher.hexdigest()
+
+
+def lock_blob(name):
+    """
+    name のファイルを使う・削除する処理が重ならないよう、トランザクションが終わるまで DocumentBlob の行をロックする。
+    トランザクションの外で呼ぶと TransactionManagementError になる
+    """
+    from .models import DocumentBlob
+
+    if not transaction.get_connection().in_atomic_block:
+        raise transaction.TransactionManagementError("書類のファイルはトランザクションの中で保存・削除してください。")
+    DocumentBlob.objects.select_for_update().get_or_create(name=name)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    書類の内容のSHA-256をファイル名にして保存するストレージ。
+    同じ内容のファイルは1つだけ保存し、複数の Document から共有する。
+    共有しているファイルの削除は signals.delete_unreferenced_document_file が、
+    最後の Document が削除されたときに行う。
+    既存のファイルを使い回したのに、Document を保存し終える前に削除されることのないよう、
+    Document はトランザクションの中で保存する（ロックは保存が確定するまで残る）
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # 同じ内容なら同じ名前を使うため、既存のファイルと重複しても名前を変えない
+        if name.startswith(BLOB_PREFIX + '/'):
+            return name
+        return super().get_available_name(name, max_length)
+
+    def _save(self, name, content):
+        blob = blob_name(content_sha256(content), os.path.splitext(name)[1])
+        # 削除中のファイルなら、削除が終わるのを待ってから確認する（なければ保存し直す）
+        lock_blob(blob)
+        if self.exists(blob):
+            return blob
+        return super()._save(blob, content)
+
+
+document_storage = ContentAddressedStorage()
+
+
+def get_document_storage():
+    return document_storage
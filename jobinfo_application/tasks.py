@@ -0,0 +1,212 @@
+import datetime
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import ai
+from .models import EntrySheet, EntrySheetGenerationJob, UserProfile
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_es_generation(entry_sheet, regenerate=False):
+    """
+    ES回答ドラフトの生成ジョブを登録する。
+    同じ設問のジョブが待機中・生成中なら、新しく作らずにそれを返す。
+    戻り値は (ジョブ, 新規作成したかどうか)
+    """
+    active_jobs = EntrySheetGenerationJob.objects.filter(
+        entry_sheet=entry_sheet, status__in=EntrySheetGenerationJob.ACTIVE_STATUSES
+    )
+    job = active_jobs.first()
+    if job is not None:
+        return job, False
+    try:
+        with transaction.atomic():
+            job = EntrySheetGenerationJob.objects.create(
+                entry_sheet=entry_sheet,
+                max_attempts=settings.ES_GENERATION_MAX_ATTEMPTS,
+                regenerate=regenerate,
+            )
+    except IntegrityError:
+        # 同時に登録された場合は、一意制約で弾かれた側が既存のジョブを使う
+        return active_jobs.get(), False
+    return job, True
+
+
+def enqueue_unanswered(job_application, regenerate=False):
+    """
+    応募情報のうち、まだ回答を書いていないES設問すべてについて生成ジョブを登録する。
+    戻り値は (新しく登録した件数, 待機中・生成中のジョブがあった件数)
+    """
+    created_count = active_count = 0
+    for entry_sheet in job_application.entry_sheets.filter(answer='').only('id').order_by('id'):
+        _, created = enqueue_es_generation(entry_sheet, regenerate=regenerate)
+        if created:
+            created_count += 1
+        else:
+            active_count += 1
+    return created_count, active_count
+
+
+def _claim_next_jobs():
+    """
+    実行可能なジョブを取り出して生成中にする。他のワーカーが処理中の行は飛ばす。
+    候補者・企業の情報を1回だけ組み立てて並行して生成できるよう、最初のジョブと同じ応募情報・同じ再生成の指定で
+    実行可能なジョブもまとめて取り出す
+    """
+    with transaction.atomic():
+        runnable = (
+            EntrySheetGenerationJob.objects
+            .select_for_update(skip_locked=True, of=('self',))
+            .filter(status=EntrySheetGenerationJob.STATUS_QUEUED, run_after__lte=timezone.now())
+        )
+        job = runnable.order_by('run_after', 'id').first()
+        if job is None:
+            return []
+        jobs = [job]
+        job_application_id = (
+            EntrySheet.objects.filter(pk=job.entry_sheet_id).values_list('job_application_id', flat=True).first()
+        )
+        if job_application_id is not None:
+            jobs += runnable.filter(
+                entry_sheet__job_application_id=job_application_id, regenerate=job.regenerate
+            ).exclude(pk=job.pk).order_by('id')
+        now = timezone.now()
+        for job in jobs:
+            job.status = EntrySheetGenerationJob.STATUS_RUNNING
+            job.attempts += 1
+            job.started_at = now
+        EntrySheetGenerationJob.objects.bulk_update(jobs, ['status', 'attempts', 'started_at'])
+    return jobs
+
+
+def _retry_delay(attempts):
+    """試行回数に応じて待ち時間を延ばす（指数バックオフ）"""
+    return datetime.timedelta(seconds=settings.ES_GENERATION_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+def _fail_deleted_job(job):
+    """処理中に設問が削除されたジョブを失敗にする（ジョブの行も削除されていれば何もしない）"""
+    logger.warning('ES generation job %s: entry sheet %s was deleted', job.pk, job.entry_sheet_id)
+    job.status = EntrySheetGenerationJob.STATUS_FAILED
+    job.last_error = 'ES設問が削除されました。'
+    job.finished_at = timezone.now()
+    EntrySheetGenerationJob.objects.filter(pk=job.pk).update(
+        status=job.status, last_error=job.last_error, finished_at=job.finished_at
+    )
+    return job
+
+
+def _retry_or_fail(job, error):
+    """失敗したジョブを、上限回数までは時間をおいて再実行する"""
+    logger.warning('ES generation job %s failed (attempt %s): %s', job.pk, job.attempts, error)
+    job.last_error = str(error)
+    if job.attempts < job.max_attempts:
+        job.status = EntrySheetGenerationJob.STATUS_QUEUED
+        job.run_after = timezone.now() + _retry_delay(job.attempts)
+    else:
+        job.status = EntrySheetGenerationJob.STATUS_FAILED
+        job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'run_after', 'last_error', 'finished_at'])
+
+
+def _save_draft(job, entry_sheet, ai_draft):
+    with transaction.atomic():
+        # 生成中に設問が削除されていれば保存しない
+        if not EntrySheet.objects.select_for_update().filter(pk=entry_sheet.pk).exists():
+            _fail_deleted_job(job)
+            return
+        entry_sheet.ai_draft = ai_draft
+        entry_sheet.save(update_fields=['ai_draft', 'updated_at'])
+        job.status = EntrySheetGenerationJob.STATUS_SUCCEEDED
+        job.last_error = ''
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'last_error', 'finished_at'])
+
+
+def run_next_jobs(client=None):
+    """
+    同じ応募情報のジョブをまとめて処理し、処理したジョブのリストを返す（なければ空のリスト）。
+    候補者・企業の情報は1回だけ組み立て、API呼び出しは ai.generate_drafts で並行して行う。
+    失敗したジョブは上限回数まで、時間をおいて再実行する
+    """
+    jobs = _claim_next_jobs()
+    entry_sheets = EntrySheet.objects.select_related('job_application__user__profile').in_bulk(
+        [job.entry_sheet_id for job in jobs]
+    )
+    pending = []
+    for job in jobs:
+        if job.entry_sheet_id in entry_sheets:
+            pending.append(job)
+        else:
+            _fail_deleted_job(job)
+    if not pending:
+        return jobs
+
+    try:
+        job_application = entry_sheets[pending[0].entry_sheet_id].job_application
+        context = ai.build_context(job_application, UserProfile.objects.for_user(job_application.user))
+        results = ai.generate_drafts(
+            [entry_sheets[job.entry_sheet_id] for job in pending], context,
+            client=client, regenerate=pending[0].regenerate,
+        )
+    except Exception as e:
+        # クライアントの作成などに失敗した場合は、すべてのジョブを失敗として扱う
+        results = [{'error': e} for _ in pending]
+    for job, result in zip(pending, results):
+        if result['error'] is not None:
+            _retry_or_fail(job, result['error'])
+        else:
+            _save_draft(job, entry_sheets[job.entry_sheet_id], result['ai_draft'])
+    return jobs
+
+
+def requeue_stale_jobs():
+    """
+    ワーカーが途中で停止して生成中のまま残ったジョブを、待機中に戻す。
+    試行回数が上限に達したジョブ（ワーカーを停止させ続けるもの）は、戻さずに失敗にする。
+    待機中に戻した件数を返す
+    """
+    now = timezone.now()
+    stale = EntrySheetGenerationJob.objects.filter(
+        status=EntrySheetGenerationJob.STATUS_RUNNING,
+        started_at__lt=now - datetime.timedelta(seconds=settings.ES_GENERATION_STALE_AFTER),
+    )
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status=EntrySheetGenerationJob.STATUS_FAILED,
+        last_error='生成中にワーカーが停止しました。',
+        finished_at=now,
+    )
+    return stale.update(status=EntrySheetGenerationJob.STATUS_QUEUED, run_after=now)
+
+
+def draft_all_unanswered(job_application, client=None, regenerate=False, max_workers=None):
+    """
+    応募情報のうち、まだ回答を書いていないES設問すべてについてドラフトを並行して生成して保存する。
+    生成が終わるまで戻らないため、管理コマンド（draft_all_es）から使う。画面からは enqueue_unanswered を使う。
+    戻り値は設問ごとの結果（ai.generate_drafts を参照）。一部が失敗しても他の設問は保存する
+    """
+    entry_sheets = list(job_application.entry_sheets.filter(answer='').order_by('id'))
+    if not entry_sheets:
+        return []
+    context = ai.build_context(job_application, UserProfile.objects.for_user(job_application.user))
+    results = ai.generate_drafts(
+        entry_sheets, context, client=client, regenerate=regenerate, max_workers=max_workers
+    )
+
+    drafted = []
+    now = timezone.now()
+    for result in results:
+        if result['error'] is not None:
+            logger.warning('ES draft for entry sheet %s failed: %s', result['entry_sheet'].pk, result['error'])
+            continue
+        entry_sheet = result['entry_sheet']
+        entry_sheet.ai_draft = result['ai_draft']
+        entry_sheet.updated_at = now
+        drafted.append(entry_sheet)
+    EntrySheet.objects.bulk_update(drafted, ['ai_draft', 'updated_at'])
+    return results
@@ -0,0 +1,203 @@
+import datetime
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from . import sha256_state
+from .models import Document, DocumentUpload
+
+
+# アップロードできる拡張子と、ファイル先頭のシグネチャ（空なら確認しない）
+ALLOWED_TYPES = {
+    'pdf': (b'%PDF-',),
+    'doc': (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1',),
+    'docx': (b'PK\x03\x04',),
+    'xlsx': (b'PK\x03\x04',),
+    'pptx': (b'PK\x03\x04',),
+    'png': (b'\x89PNG\r\n\x1a\n',),
+    'jpg': (b'\xff\xd8\xff',),
+    'jpeg': (b'\xff\xd8\xff',),
+    'txt': (),
+}
+SIGNATURE_LENGTH = 8
+READ_BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """アップロードを受け付けられない場合のエラー。status はAPIで返すHTTPステータス"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def file_extension(filename):
+    return os.path.splitext(filename)[1].lstrip('.').lower()
+
+
+def validate_file(filename, size):
+    """ファイル名とサイズが制限内か確認する"""
+    if file_extension(filename) not in ALLOWED_TYPES:
+        raise UploadError(f"アップロードできるファイルの種類は {', '.join(sorted(ALLOWED_TYPES))} です。")
+    if size > settings.DOCUMENT_UPLOAD_MAX_SIZE:
+        raise UploadError(
+            f"ファイルサイズの上限は {settings.DOCUMENT_UPLOAD_MAX_SIZE // (1024 * 1024)}MB です。", status=413
+        )
+
+
+def validate_signature(filename, head):
+    """ファイルの先頭が拡張子に合った形式になっているか確認する"""
+    signatures = ALLOWED_TYPES[file_extension(filename)]
+    if signatures and not any(head.startswith(signature) for signature in signatures):
+        raise UploadError("ファイルの内容が拡張子と一致しません。", status=415)
+
+
+def hash_file(file, size=None):
+    """ファイルを少しずつ読みながらSHA-256を計算する"""
+    hasher = hashlib.sha256()
+    remaining = size
+    while remaining is None or remaining > 0:
+        block = file.read(READ_BLOCK_SIZE if remaining is None else min(READ_BLOCK_SIZE, remaining))
+        if not block:
+            break
+        hasher.update(block)
+        if remaining is not None:
+            remaining -= len(block)
+    return hasher
+
+
+def check_uploaded_file(uploaded_file):
+    """
+    通常のフォームでアップロードされたファイルの種類とサイズを確認し、SHA-256を返す。
+    （Djangoのアップロードハンドラーが大きなファイルを一時ファイルに書き出すため、全体をメモリには読み込まない）
+    """
+    validate_file(uploaded_file.name, uploaded_file.size)
+    hasher = hashlib.sha256()
+    for i, chunk in enumerate(uploaded_file.chunks()):
+        if i == 0:
+            validate_signature(uploaded_file.name, chunk[:SIGNATURE_LENGTH])
+        hasher.update(chunk)
+    uploaded_file.seek(0)
+    return hasher.hexdigest()
+
+
+def start_upload(user, job_application, name, filename, size):
+    """分割アップロードのセッションを作り、空の一時ファイルを用意する"""
+    filename = os.path.basename(filename or '')
+    validate_file(filename, size)
+    upload = DocumentUpload.objects.create(
+        user=user, job_application=job_application, name=name or filename, filename=filename, size=size,
+        sha256_state=sha256_state.new() if sha256_state.available() else b'',
+    )
+    os.makedirs(settings.DOCUMENT_UPLOAD_TEMP_DIR, exist_ok=True)
+    open(upload.temp_path, 'wb').close()
+    return upload
+
+
+class _PartialFile(File):
+    """一時ファイルをコピーせずにストレージへ移動させるためのラッパー（FileSystemStorage がこのメソッドを見る）"""
+
+    def temporary_file_path(self):
+        return self.name
+
+
+def _complete(upload):
+    with open(upload.temp_path, 'rb') as f:
+        if upload.sha256_state:
+            upload.sha256 = sha256_state.hexdigest(upload.sha256_state)
+        else:
+            # 途中の状態を保存できない環境では、受信し終えたファイルを読んで計算する
+            upload.sha256 = hash_file(f).hexdigest()
+            f.seek(0)
+        document = Document(
+            job_application_id=upload.job_application_id, name=upload.name, sha256=upload.sha256, size=upload.size
+        )
+        content = _PartialFile(f, name=upload.temp_path)
+        content.sha256 = upload.sha256
+        document.uploaded_file.save(upload.filename, content, save=False)
+        document.save()
+    # 同じ内容のファイルが保存済みで、一時ファイルが移動されなかった場合
+    if os.path.exists(upload.temp_path):
+        os.remove(upload.temp_path)
+    upload.document = document
+    upload.status = DocumentUpload.STATUS_COMPLETED
+
+
+def _receive(stream, length):
+    """stream から length バイトまでを読み、一時ファイル（小さければメモリ）にためて返す"""
+    os.makedirs(settings.DOCUMENT_UPLOAD_TEMP_DIR, exist_ok=True)
+    chunk = tempfile.SpooledTemporaryFile(max_size=READ_BLOCK_SIZE, dir=settings.DOCUMENT_UPLOAD_TEMP_DIR)
+    received = 0
+    while received < length:
+        block = stream.read(min(READ_BLOCK_SIZE, length - received))
+        if not block:
+            break
+        chunk.write(block)
+        received += len(block)
+    chunk.seek(0)
+    return chunk, received
+
+
+def write_chunk(upload_id, user, offset, stream, length):
+    """
+    offset の位置から length バイトを stream から読み、一時ファイルに書き込む。
+    データはメモリにためずに少しずつ書き込む。
+    すべて受信したら Document を作成する。更新後のセッションを返す
+    """
+    if length > settings.DOCUMENT_UPLOAD_CHUNK_SIZE:
+        raise UploadError(
+            f"1回に送信できるのは {settings.DOCUMENT_UPLOAD_CHUNK_SIZE} バイトまでです。", status=413
+        )
+    # 通信の遅いクライアントの間も行をロックし続けないよう、本文はロックを取る前に受信し終える
+    chunk, received = _receive(stream, length)
+    with chunk, transaction.atomic():
+        # 同じセッションへの書き込みが重ならないよう、行をロックする
+        upload = DocumentUpload.objects.select_for_update().get(pk=upload_id, user=user)
+        if upload.status != DocumentUpload.STATUS_UPLOADING:
+            raise UploadError("このアップロードは完了しています。", status=409)
+        if offset != upload.offset:
+            raise UploadError(f"送信位置が一致しません（受信済み: {upload.offset} バイト）。", status=409)
+        if upload.offset + length > upload.size:
+            raise UploadError("宣言したファイルサイズを超えています。", status=413)
+
+        if upload.offset == 0:
+            validate_signature(upload.filename, chunk.read(SIGNATURE_LENGTH))
+            chunk.seek(0)
+        with open(upload.temp_path, 'r+b') as f:
+            f.seek(upload.offset)
+            f.truncate()
+            shutil.copyfileobj(chunk, f, READ_BLOCK_SIZE)
+        if upload.sha256_state:
+            # 受信したデータの分だけSHA-256を進め、完了時にファイル全体を読み直さずに済むようにする
+            chunk.seek(0)
+            upload.sha256_state = sha256_state.update(upload.sha256_state, chunk)
+
+        upload.offset += received
+        if upload.offset == upload.size:
+            _complete(upload)
+        upload.save()
+    return upload
+
+
+def abort_upload(upload):
+    """セッションと一時ファイルを削除する"""
+    if os.path.exists(upload.temp_path):
+        os.remove(upload.temp_path)
+    upload.delete()
+
+
+def purge_expired_uploads():
+    """一定時間更新のない未完了のセッションと、完了済みのセッションを削除する。削除した件数を返す"""
+    threshold = timezone.now() - datetime.timedelta(seconds=settings.DOCUMENT_UPLOAD_SESSION_TTL)
+    expired = DocumentUpload.objects.filter(updated_at__lt=threshold)
+    count = 0
+    for upload in expired.iterator():
+        abort_upload(upload)
+        count += 1
+    return count
@@ -7,6 +7,9 @@ urlpatterns = [
     # API
     path('api/search-company/', views.search_company_view, name='search-company'),
     path('api/search-jobtypes/', views.search_jobtype_view, name='search-jobtype'),
+    path('api/ai-cache-stats/', views.ai_cache_stats_view, name='ai-cache-stats'),
+    path('api/dashboard-stats/', views.dashboard_stats_view, name='dashboard-stats'),
+    path('metrics/', views.metrics_view, name='metrics'),
     
     # 認証
     path('signup/', views.signup_view, name='signup'),
@@ -15,11 +18,17 @@ urlpatterns = [
     path('', views.application_list, name='application-list'),
     path('application/<int:pk>/', views.application_detail, name='application-detail'),
     path('application/new/', views.application_create, name='application-create'),
+    path('application/import/', views.application_import, name='application-import'),
     path('application/<int:pk>/update/', views.application_update, name='application-update'),
     path('application/<int:pk>/delete/', views.application_delete, name='application-delete'),
+    path('search/', views.search_view, name='search'),
+    path('export/', views.export_view, name='export'),
     
     # 書類
     path('application/<int:pk>/add_document/', views.add_document, name='add-document'),
+    path('application/<int:pk>/uploads/', views.document_upload_create, name='document-upload-create'),
+    path('uploads/<uuid:upload_id>/', views.document_upload_detail, name='document-upload-detail'),
+    path('document/<int:pk>/download/', views.document_download, name='document-download'),
     
     # プロフィール
     path('profile/', views.profile_edit_view, name='profile-edit'),
@@ -31,9 +40,12 @@ urlpatterns = [
     
     # ES作成支援
     path('application/<int:job_app_pk>/es/new/', views.es_question_create, name='es-question-create'), 
+    path('application/<int:job_app_pk>/es/generate-all/', views.es_generate_all_view, name='es-generate-all'),
     path('es/<int:pk>/', views.es_detail_view, name='es-detail'),
     path('es/<int:pk>/update/', views.es_answer_update, name='es-answer-update'),
     path('es/<int:pk>/delete/', views.es_question_delete, name='es-question-delete'),
     path('es/<int:pk>/generate/', views.generate_es_answer_view, name='es-generate-answer'),
+    path('es/<int:pk>/generate/stream/', views.es_stream_answer_view, name='es-stream-answer'),
+    path('es/<int:pk>/generate/status/', views.es_generation_status_view, name='es-generate-status'),
 
 ]
\ No newline at end of file
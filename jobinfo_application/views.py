@@ -1,20 +1,40 @@
-import requests
+import hashlib
+import json
 
-from openai import OpenAI
-from django.http import JsonResponse
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
 from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import login
 from django.contrib import messages
+from django.db import transaction
+from django.utils import timezone
 from .models import (
     JobApplication, UserProfile, JobType,
-    InterviewLog, EntrySheet
+    InterviewLog, EntrySheet, EntrySheetGenerationJob, Document, DocumentUpload
 )
 from .forms import (
     JobApplicationForm, DocumentForm, SignUpForm, UserProfileForm,
-    InterviewLogForm, EntrySheetQuestionForm, EntrySheetAnswerForm
+    InterviewLogForm, EntrySheetQuestionForm, EntrySheetAnswerForm,
+    ApplicationFilterForm, CSVImportForm, parse_job_type_names
 )
+from .pagination import paginate_by_cursor
+from .events import get_upcoming_events
+from .stats import get_dashboard_stats
+from .search import full_text_search
+from .csv_import import CSVImportError, decode_upload, import_applications
+from .downloads import serve_document
+from .company_search import search_companies
+from .tasks import enqueue_es_generation, enqueue_unanswered
+from .fragments import fragment_context
+from . import ai, ai_cache, export, metrics, uploads
 
 
 
@@ -37,7 +57,7 @@ def signup_view(request):
 @login_required
 def profile_edit_view(request):
     """プロフィール編集"""
-    profile, created = UserProfile.objects.get_or_create(user=request.user)
+    profile = UserProfile.objects.for_user(request.user)
     if request.method == 'POST':
         form = UserProfileForm(request.POST, instance=profile)
         if form.is_valid():
@@ -48,39 +68,129 @@ def profile_edit_view(request):
         form = UserProfileForm(instance=profile)
     return render(request, 'jobinfo_application/profile_form.html', {'form': form})
 
+# 一覧・詳細ページの条件付きGET。ページの内容はユーザーのデータのバージョン（fragments.py）が
+# 上がるまで変わらないため、バージョンを読むだけで 304 を返せる。
+# バージョンはデータベースにあるので、別のプロセスやワーカーで保存した変更でもETagが変わる
+
+def _page_etag(request, version, *parts):
+    """
+    ページのETag。CSRFの秘密鍵も含め、ログインし直した後に古いトークンのフォームが使われないようにする。
+    表示待ちのメッセージがあるときは、ページを作る必要があるため None を返す
+    """
+    if len(messages.get_messages(request)):
+        return None
+    key = ':'.join(str(part) for part in (request.user.pk, version, request.META.get('CSRF_COOKIE', ''), *parts))
+    return quote_etag(hashlib.sha256(key.encode()).hexdigest()[:32])
+
+
+def _with_etag(response, etag):
+    if etag:
+        response['ETag'] = etag
+    # ブラウザには保存させるが、表示のたびに変更の有無を確認させる
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _not_modified(request, etag):
+    """If-None-Match が etag と一致すれば 304 のレスポンスを返す"""
+    response = get_conditional_response(request, etag=etag) if etag else None
+    return _with_etag(response, etag) if response is not None else None
+
+
 # 応募情報 
 
 @login_required
 def application_list(request):
     """応募情報の一覧"""
-    applications = JobApplication.objects.filter(user=request.user).order_by('-applied_at')
-    context = {'applications': applications}
-    return render(request, 'jobinfo_application/jobapplication_list.html', context)
+    fragments = fragment_context(request.user)
+    # 今後の予定は日付が変わると変わる
+    etag = _page_etag(request, fragments['fragment_version'], timezone.localdate())
+    response = _not_modified(request, etag)
+    if response is not None:
+        return response
+
+    applications = JobApplication.objects.filter(user=request.user).summary()
+    filter_form = ApplicationFilterForm(request.GET)
+    if filter_form.is_valid():
+        applications = filter_form.filter_queryset(applications)
+
+    page_size = getattr(settings, 'APPLICATION_LIST_PAGE_SIZE', 20)
+    applications, next_cursor = paginate_by_cursor(applications, request.GET.get('cursor'), page_size)
+
+    next_page_query = None
+    if next_cursor:
+        query = request.GET.copy()
+        query['cursor'] = next_cursor
+        next_page_query = query.urlencode()
+
+    context = {
+        'applications': applications,
+        'upcoming_events': get_upcoming_events(request.user, version=fragments['fragment_version']),
+        'filter_form': filter_form,
+        'next_page_query': next_page_query,
+        **fragments,
+    }
+    return _with_etag(render(request, 'jobinfo_application/jobapplication_list.html', context), etag)
+
+
+SEARCH_RESULT_LIMIT = 30
+
+
+@login_required
+def search_view(request):
+    """応募情報・面接ログ・ES設問の全文検索"""
+    query = request.GET.get('q', '').strip()
+    results = full_text_search(request.user, query, limit=SEARCH_RESULT_LIMIT) if query else []
+    return render(request, 'jobinfo_application/search_results.html', {'query': query, 'results': results})
+
+
+@login_required
+def dashboard_stats_view(request):
+    """選考ステージ別の件数・通過率・月別の面接数を返すAPIビュー"""
+    return JsonResponse(get_dashboard_stats(request.user.pk))
 
 
 @login_required
 def application_detail(request, pk):
     """応募情報の詳細"""
-    application = get_object_or_404(JobApplication, pk=pk, user=request.user)
+    fragments = fragment_context(request.user)
+    etag = _page_etag(request, fragments['fragment_version'], pk)
+    response = _not_modified(request, etag)
+    if response is not None:
+        return response
+
+    application = get_object_or_404(JobApplication.objects.for_detail_page(), pk=pk, user=request.user)
     context = {
         'job_application': application,
+        # 断片がキャッシュにあれば、書類・面接ログ・ES設問は読み込まない
+        **application.detail_sections(),
+        **fragments,
         'document_form': DocumentForm(),
         'interview_log_form': InterviewLogForm(),
         'es_question_form': EntrySheetQuestionForm(),
     }
-    return render(request, 'jobinfo_application/jobapplication_detail.html', context)
+    return _with_etag(render(request, 'jobinfo_application/jobapplication_detail.html', context), etag)
 
 
 def _handle_job_types(form, application_instance):
     """自由記述の職種カテゴリを処理するヘルパー関数"""
-    job_types_str = form.cleaned_data.get('job_types_input', '')
-    application_instance.job_types.clear()
-    if job_types_str:
-        job_type_names = [name.strip() for name in job_types_str.split(',')]
-        for name in job_type_names:
-            if name:
-                job_type, _ = JobType.objects.get_or_create(name=name)
-                application_instance.job_types.add(job_type)
+    job_type_names = parse_job_type_names(form.cleaned_data.get('job_types_input', ''))
+    through = JobApplication.job_types.through
+    with transaction.atomic():
+        wanted_ids = set(JobType.objects.resolve_names(job_type_names).values())
+        current_ids = set(
+            through.objects.filter(jobapplication=application_instance).values_list('jobtype_id', flat=True)
+        )
+        # 中間テーブルは差分だけを更新する
+        removed_ids = current_ids - wanted_ids
+        if removed_ids:
+            through.objects.filter(jobapplication=application_instance, jobtype_id__in=removed_ids).delete()
+        added_ids = wanted_ids - current_ids
+        if added_ids:
+            through.objects.bulk_create(
+                [through(jobapplication=application_instance, jobtype_id=jobtype_id) for jobtype_id in added_ids],
+                ignore_conflicts=True,
+            )
 
 
 @login_required
@@ -96,10 +206,34 @@ def application_create(request):
             return redirect('application-detail', pk=application.pk)
     else:
         form = JobApplicationForm()
-    context = {'form': form, 'all_job_types': JobType.objects.all()}
+    context = {'form': form}
     return render(request, 'jobinfo_application/jobapplication_form.html', context)
 
 
+@login_required
+def application_import(request):
+    """CSVファイルから応募情報を一括登録する"""
+    result = None
+    if request.method == 'POST':
+        form = CSVImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            try:
+                result = import_applications(
+                    request.user,
+                    decode_upload(form.cleaned_data['csv_file']),
+                    skip_invalid=form.cleaned_data['skip_invalid'],
+                )
+            except CSVImportError as e:
+                form.add_error('csv_file', str(e))
+            else:
+                if result.committed and not result.error_count:
+                    messages.success(request, f'{result.created} 件の応募情報を登録しました。')
+                    return redirect('application-list')
+    else:
+        form = CSVImportForm()
+    return render(request, 'jobinfo_application/jobapplication_import.html', {'form': form, 'result': result})
+
+
 @login_required
 def application_update(request, pk):
     """応募情報の更新"""
@@ -113,7 +247,7 @@ def application_update(request, pk):
             return redirect('application-detail', pk=application.pk)
     else:
         form = JobApplicationForm(instance=application)
-    context = {'form': form, 'all_job_types': JobType.objects.all()}
+    context = {'form': form}
     return render(request, 'jobinfo_application/jobapplication_form.html', context)
 
 
@@ -137,11 +271,90 @@ def add_document(request, pk):
         if form.is_valid():
             document = form.save(commit=False)
             document.job_application = application
-            document.save()
+            # ファイルの保存と書類の行の作成を1つのトランザクションにする（storage.lock_blob を参照）
+            with transaction.atomic():
+                document.save()
             messages.success(request, '書類をアップロードしました。')
+        else:
+            for error in form.errors.get('uploaded_file', []):
+                messages.error(request, error)
     return redirect('application-detail', pk=pk)
 
 
+@login_required
+def document_download(request, pk):
+    """書類のダウンロード。持ち主の確認と書類の取得を1回のクエリで行う"""
+    document = get_object_or_404(
+        Document.objects.only('id', 'name', 'uploaded_file', 'sha256'), pk=pk, job_application__user=request.user
+    )
+    return serve_document(request, document)
+
+
+def _upload_status(upload):
+    data = {
+        'id': str(upload.pk),
+        'offset': upload.offset,
+        'size': upload.size,
+        'status': upload.status,
+        'chunk_size': settings.DOCUMENT_UPLOAD_CHUNK_SIZE,
+        'url': reverse('document-upload-detail', kwargs={'upload_id': upload.pk}),
+    }
+    if upload.status == DocumentUpload.STATUS_COMPLETED:
+        data['sha256'] = upload.sha256
+        data['document_id'] = upload.document_id
+    return data
+
+
+@login_required
+def document_upload_create(request, pk):
+    """書類の分割アップロードを開始するAPIビュー（ファイル名とサイズを受け取り、セッションを作る）"""
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    application = get_object_or_404(JobApplication, pk=pk, user=request.user)
+    try:
+        size = int(request.POST.get('size', ''))
+    except ValueError:
+        return JsonResponse({'error': 'size を指定してください。'}, status=400)
+    try:
+        upload = uploads.start_upload(
+            request.user, application, request.POST.get('name', ''), request.POST.get('filename', ''), size
+        )
+    except uploads.UploadError as e:
+        return JsonResponse({'error': str(e)}, status=e.status)
+    return JsonResponse(_upload_status(upload), status=201)
+
+
+@login_required
+def document_upload_detail(request, upload_id):
+    """
+    分割アップロードのセッション。
+    GET: 受信済みのバイト数を返す（中断後の再開に使う）
+    PATCH: Upload-Offset ヘッダーの位置から、リクエスト本文を書き込む
+    DELETE: アップロードを中止する
+    """
+    upload = get_object_or_404(DocumentUpload, pk=upload_id, user=request.user)
+    if request.method == 'GET':
+        return JsonResponse(_upload_status(upload))
+    if request.method == 'DELETE':
+        uploads.abort_upload(upload)
+        return HttpResponse(status=204)
+    if request.method != 'PATCH':
+        return HttpResponseNotAllowed(['GET', 'PATCH', 'DELETE'])
+
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+        length = int(request.headers.get('Content-Length', ''))
+    except ValueError:
+        return JsonResponse({'error': 'Upload-Offset と Content-Length を指定してください。'}, status=400)
+    try:
+        # request.body を使うと本文全体がメモリに読み込まれるため、request から直接少しずつ読む
+        upload = uploads.write_chunk(upload.pk, request.user, offset, request, length)
+    except uploads.UploadError as e:
+        upload.refresh_from_db()
+        return JsonResponse({'error': str(e), **_upload_status(upload)}, status=e.status)
+    return JsonResponse(_upload_status(upload))
+
+
 # 面接ログ 
 
 @login_required
@@ -221,7 +434,11 @@ def es_detail_view(request, pk):
     """ES設問の詳細・回答編集"""
     entry_sheet = get_object_or_404(EntrySheet, pk=pk, job_application__user=request.user)
     form = EntrySheetAnswerForm(instance=entry_sheet)
-    context = {'entry_sheet': entry_sheet, 'form': form}
+    context = {
+        'entry_sheet': entry_sheet,
+        'form': form,
+        'generation_job': entry_sheet.generation_jobs.first(),
+    }
     return render(request, 'jobinfo_application/es_detail.html', context)
 
 
@@ -251,79 +468,169 @@ def es_question_delete(request, pk):
 
 @login_required
 def generate_es_answer_view(request, pk):
-    """ES設問に対する回答をAIが生成"""
+    """ES設問に対する回答をAIが生成（ジョブを登録し、ワーカーが非同期で処理）"""
     entry_sheet = get_object_or_404(EntrySheet, pk=pk, job_application__user=request.user)
-    job_application = entry_sheet.job_application
-    user_profile = request.user.profile
-    
-    user_info = f"スキル: {user_profile.skills}\n経験: {user_profile.experience}\n自己PR: {user_profile.self_pr}"
-    company_info = f"企業名: {job_application.company_name}\n経営理念: {job_application.corporate_philosophy}\n求める人物像: {job_application.ideal_candidate}\n業務内容: {job_application.job_description}"
+    if request.method == 'POST':
+        job, created = enqueue_es_generation(entry_sheet, regenerate=bool(request.POST.get('regenerate')))
+        if created:
+            messages.info(request, 'AIによる回答の生成を開始しました。完了するまでしばらくお待ちください。')
+        else:
+            messages.info(request, 'この設問の回答はすでに生成中です。')
+    return redirect('es-detail', pk=pk)
+
 
+@login_required
+def es_generate_all_view(request, job_app_pk):
+    """未回答のES設問すべてについて、AIによる回答ドラフトの生成ジョブを登録（生成はワーカーが行う）"""
+    job_application = get_object_or_404(JobApplication, pk=job_app_pk, user=request.user)
     if request.method == 'POST':
-        prompt = f"""あなたは優秀なキャリアアドバイザーです。以下のES設問に対し、候補者のプロフィールと企業の情報を最大限に活用し、説得力のある回答ドラフトを400字程度で作成してください。
+        created, active = enqueue_unanswered(job_application, regenerate=bool(request.POST.get('regenerate')))
+        if not created and not active:
+            messages.info(request, '未回答のES設問はありません。')
+        if created:
+            messages.success(request, f'{created}件の設問の回答ドラフトの生成を開始しました。完了まで少しお待ちください。')
+        if active:
+            messages.info(request, f'{active}件の設問はすでに生成中です。')
+    return redirect('application-detail', pk=job_app_pk)
 
-    # ES設問
-    {entry_sheet.question}
 
-    # 候補者のプロフィール情報
-    {user_info}
+@login_required
+def es_generation_status_view(request, pk):
+    """AIによる回答生成ジョブの状態を返すAPIビュー（画面からのポーリング用）"""
+    entry_sheet = get_object_or_404(EntrySheet, pk=pk, job_application__user=request.user)
+    job = entry_sheet.generation_jobs.first()
+    if job is None:
+        return JsonResponse({'status': None})
+    data = {'status': job.status, 'status_display': job.get_status_display(), 'attempts': job.attempts}
+    if job.status == EntrySheetGenerationJob.STATUS_SUCCEEDED:
+        data['ai_draft'] = entry_sheet.ai_draft
+    elif job.status == EntrySheetGenerationJob.STATUS_FAILED:
+        data['error'] = job.last_error
+    return JsonResponse(data)
 
-    # 企業の情報
-    {company_info}
 
-    # 作成する回答ドラフト
-    """
-        try:
-            
-            client = OpenAI(api_key=settings.OPENAI_API_KEY)
-            
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",  
-                messages=[
-                    {"role": "system", "content": "あなたは優秀なキャリアアドバイザーです。"},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=600,
-                temperature=0.7
-            )
-            
-            ai_draft = response.choices[0].message.content.strip()
+def _get_authenticated_user(request):
+    user = request.user
+    return user if user.is_authenticated else None
 
-            if ai_draft: 
-                entry_sheet.ai_draft = ai_draft
-                entry_sheet.save()
-                messages.success(request, 'AIによる回答の提案を生成しました。')
-            else:
-                messages.warning(request, 'AIが空の回答を返しました。再度お試しください。')
-            
-        except Exception as e:
-            messages.error(request, f"AIの呼び出し中にエラーが発生しました: {e}")
-    
-    return redirect('es-detail', pk=pk)
+
+def _sse(event, data):
+    """Server-Sent Events 形式の1イベント"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _stream_es_answer_events(entry_sheet, context, regenerate=False):
+    chunks = []
+    try:
+        async for text in ai.stream_draft(entry_sheet.question, context, regenerate=regenerate):
+            chunks.append(text)
+            yield _sse('token', {'text': text})
+    except Exception as e:
+        yield _sse('error', {'message': f"AIの呼び出し中にエラーが発生しました: {e}"})
+        return
+
+    ai_draft = ''.join(chunks).strip()
+    if not ai_draft:
+        yield _sse('error', {'message': 'AIが空の回答を返しました。再度お試しください。'})
+        return
+    await EntrySheet.objects.filter(pk=entry_sheet.pk).aupdate(ai_draft=ai_draft, updated_at=timezone.now())
+    yield _sse('done', {'ai_draft': ai_draft})
+
+
+async def es_stream_answer_view(request, pk):
+    """ES設問に対する回答をAIが生成し、トークンが届くたびにSSEで送る（ASGIで動かす）"""
+    user = await sync_to_async(_get_authenticated_user)(request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    try:
+        entry_sheet = await EntrySheet.objects.select_related('job_application__user__profile').aget(
+            pk=pk, job_application__user=user
+        )
+    except EntrySheet.DoesNotExist:
+        raise Http404
+    job_application = entry_sheet.job_application
+    profile = await sync_to_async(UserProfile.objects.for_user)(job_application.user)
+    context = ai.build_context(job_application, profile)
+
+    response = StreamingHttpResponse(
+        _stream_es_answer_events(entry_sheet, context, regenerate=bool(request.POST.get('regenerate'))),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # リバースプロキシにバッファリングさせず、トークンをそのまま流す
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def export_view(request):
+    """ユーザーの応募履歴すべてを CSV または NDJSON で少しずつ送信する（ASGIで動かす）"""
+    user = await sync_to_async(_get_authenticated_user)(request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+    export_format = request.GET.get('format', export.FORMAT_CSV)
+    if export_format not in export.FORMATS:
+        return HttpResponseBadRequest(f"format は {', '.join(export.FORMATS)} のいずれかを指定してください。")
+
+    response = StreamingHttpResponse(
+        export.aiter_export(user.pk, export_format), content_type=export.CONTENT_TYPES[export_format]
+    )
+    filename = f"jobinfo-{timezone.localdate():%Y%m%d}.{export_format}"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@staff_member_required
+def ai_cache_stats_view(request):
+    """AIの応答キャッシュのヒット・ミス件数と、節約できた時間・トークン数を返すAPIビュー（管理者用）"""
+    return JsonResponse(ai_cache.stats())
+
+
+@staff_member_required
+def metrics_view(request):
+    """ビューごとの処理時間・クエリ数をPrometheusのテキスト形式で返す（管理者用、METRICS_ENABLED=True のとき）"""
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
 # 外部API連携ビュー
 
+@login_required
 def search_company_view(request):
     """Wikidata APIを呼び出し、企業名を検索して候補を返すAPIビュー"""
     company_name = request.GET.get('name', '')
-    if len(company_name) < 2:
+    if len(company_name.strip()) < 2:
         return JsonResponse([], safe=False)
-    api_url = "https://www.wikidata.org/w/api.php"
-    params = {"action": "wbsearchentities", "format": "json", "language": "ja", "type": "item", "search": company_name}
-    try:
-        response = requests.get(api_url, params=params, timeout=5)
-        response.raise_for_status()
-        data = response.json()
-        candidates = [{'name': result.get('label')} for result in data.get("search", [])]
-        return JsonResponse(candidates, safe=False)
-    except requests.exceptions.RequestException:
-        return JsonResponse({'error': 'API request failed'}, status=500)
+    candidates = [{'name': name} for name in search_companies(request.user, company_name)]
+    return JsonResponse(candidates, safe=False)
+
+
+JOBTYPE_AUTOCOMPLETE_MIN_LENGTH = 2
+JOBTYPE_AUTOCOMPLETE_LIMIT = 10
+JOBTYPE_AUTOCOMPLETE_CACHE_SECONDS = 60
+
 
 @login_required
 def search_jobtype_view(request):
     """データベース内の既存の職種カテゴリを検索して候補を返すAPIビュー"""
-    query = request.GET.get('term', '')
-    job_types = JobType.objects.filter(name__icontains=query)[:10]
-    results = [jt.name for jt in job_types]
-    return JsonResponse(results, safe=False)
\ No newline at end of file
+    query = request.GET.get('term', '').strip()
+    if len(query) < JOBTYPE_AUTOCOMPLETE_MIN_LENGTH:
+        results = []
+    else:
+        # 職種カテゴリは全ユーザー共通のため、同じ入力に対する結果はサーバー側でも共有する
+        cache_key = 'jobtype-autocomplete:' + hashlib.sha256(query.casefold().encode()).hexdigest()
+        results = cache.get(cache_key)
+        if results is None:
+            results = list(JobType.objects.autocomplete(query, limit=JOBTYPE_AUTOCOMPLETE_LIMIT))
+            cache.set(cache_key, results, JOBTYPE_AUTOCOMPLETE_CACHE_SECONDS)
+
+    etag = quote_etag(hashlib.sha256(json.dumps(results).encode()).hexdigest()[:32])
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(results, safe=False)
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, max_age=JOBTYPE_AUTOCOMPLETE_CACHE_SECONDS)
+    return response
@@ -0,0 +1,11 @@
+#!/usr/bin/env bash
+# exit on error
+set -o errexit
+
+# 書類は Web サービスのディスク（MEDIA_ROOT）に保存されていて、Render の別のサービスからは読めない。
+# そのため本文の抽出ワーカーは別サービスにせず、ファイルのある Web サービスの中で動かす。
+# ワーカーが異常終了しても Web サーバーは止めずに、少し待ってから起動し直す。
+# ワーカーは1つのスレッドで動き続けるため、接続を使い回す（DB_CONN_MAX_AGE は settings.py を参照）
+(while true; do DB_CONN_MAX_AGE=600 python manage.py run_extraction_worker || true; sleep 5; done) &
+
+exec gunicorn JobInfo_management.asgi:application -k uvicorn_worker.UvicornWorker